@@ -0,0 +1,145 @@
+"""
+Бенчмарк накладных расходов диспетчеризации апдейтов (без сети и без выполнения хэндлеров).
+
+Для каждого апдейта повторяется то, что делает Application.process_update: по всем группам
+по порядку вызывается check_update хэндлеров до первого совпадения в группе.
+Сравниваются две схемы регистрации:
+- "до"    — прежняя цепочка: ~20 MessageHandler с regex в группе 2, фильтры TEXT/Regex в группах 5-7;
+- "после" — текущая utils/setup_handlers.py: диспетчер "!"-команд и фильтры по признакам сообщения.
+
+Запуск из корня проекта:
+    python benchmarks/bench_dispatch.py [кол-во апдейтов каждого вида]
+"""
+
+import os
+import sys
+import time
+import warnings
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Chat, Message, PhotoSize, Update, User
+from telegram.ext import (
+    Application, CallbackQueryHandler, ChatMemberHandler, CommandHandler, ConversationHandler,
+    MessageHandler, filters
+)
+
+from utils.setup_handlers import setup_all_handlers
+
+DEFAULT_ROUNDS = 2000
+
+LEGACY_COMMANDS = [
+    "!group", "!prefix", "!help", "!rules", "!del-rules", "!status", "!debug-all", "!add-admin",
+    "!admins", "!del-admin", "!ban", "!roulette", "!join", "!startgame", "!endgame", "!shootme", "!shoot",
+]
+
+
+async def _noop(update, context):
+    pass
+
+
+# Прежняя схема регистрации (до диспетчера команд и признаков сообщений)
+def setup_legacy_handlers(app):
+    app.add_handler(MessageHandler(filters.ALL, _noop), group=0)
+    app.add_handler(ChatMemberHandler(_noop, ChatMemberHandler.ANY_CHAT_MEMBER), group=0)
+
+    app.add_handler(ConversationHandler(
+        entry_points=[MessageHandler(filters.TEXT & filters.Regex(r"^!set-rules"), _noop)],
+        states={0: [MessageHandler(filters.TEXT & filters.Regex(r"^\d+$"), _noop)]},
+        fallbacks=[MessageHandler(filters.COMMAND, _noop)]
+    ), group=1)
+
+    for command in LEGACY_COMMANDS:
+        app.add_handler(MessageHandler(filters.TEXT & filters.Regex(rf"^{command}"), _noop), group=2)
+    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!export_db(?:\s|$).+"), _noop), group=2)
+    app.add_handler(ConversationHandler(
+        entry_points=[MessageHandler(filters.Regex(r"^!export_db$"), _noop)],
+        states={0: [MessageHandler(filters.TEXT & ~filters.COMMAND, _noop)]},
+        fallbacks=[MessageHandler(filters.ALL, _noop)]
+    ), group=2)
+    app.add_handler(MessageHandler(filters.Regex(r"^!clear-cmd"), _noop), group=2)
+    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!restart$"), _noop), group=2)
+
+    app.add_handler(CallbackQueryHandler(_noop, pattern="^group_"), group=3)
+    app.add_handler(CallbackQueryHandler(_noop, pattern="^help_"), group=3)
+    app.add_handler(CallbackQueryHandler(_noop, pattern="^rules_"), group=3)
+
+    for command in ("reply", "send_photo", "send_video", "export_users", "export_chat"):
+        app.add_handler(CommandHandler(command, _noop), group=4)
+    app.add_handler(MessageHandler(filters.PHOTO & filters.CaptionRegex(r"^/send_photo\s+\d+"), _noop), group=4)
+    app.add_handler(MessageHandler(filters.VIDEO & filters.CaptionRegex(r"^/send_video\s+\d+"), _noop), group=4)
+
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, _noop), group=5)
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.Regex(r"^!"), _noop), group=6)
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.Regex(r"^!"), _noop), group=7)
+    app.add_handler(MessageHandler(filters.ChatType.GROUPS & ~filters.StatusUpdate.ALL, _noop), group=8)
+
+
+def build_app(setup):
+    app = Application.builder().token("123:BENCHMARK").build()
+    setup(app)
+    return app
+
+
+# Набор апдейтов: у каждого свой update_id, как в реальном потоке
+def make_updates(rounds):
+    group = Chat(-100123, Chat.SUPERGROUP)
+    private = Chat(42, Chat.PRIVATE)
+    user = User(42, "Tester", False)
+    replied = Message(1, datetime.now(), group, from_user=user, text="ранее")
+    photo = [PhotoSize("file", "unique", 90, 90)]
+
+    kinds = {
+        "группа: текст": dict(chat=group, text="привет всем"),
+        "группа: ответ": dict(chat=group, text="согласен", reply_to_message=replied),
+        "группа: фото": dict(chat=group, photo=photo, caption="смотрите"),
+        "группа: !команда": dict(chat=group, text="!rules 2"),
+        "группа: !shoot": dict(chat=group, text="!shoot @user"),
+        "ЛС: текст": dict(chat=private, text="здравствуйте"),
+    }
+
+    update_id = 0
+    updates = {}
+    for name, fields in kinds.items():
+        batch = []
+        for _ in range(rounds):
+            update_id += 1
+            message = Message(update_id, datetime.now(), from_user=user, **fields)
+            batch.append(Update(update_id, message=message))
+        updates[name] = batch
+    return updates
+
+
+def dispatch_cost(app, updates):
+    groups = [app.handlers[group] for group in sorted(app.handlers)]
+    start = time.perf_counter()
+    for update in updates:
+        for handlers in groups:
+            for handler in handlers:
+                check = handler.check_update(update)
+                if check is not None and check is not False:
+                    break
+    return (time.perf_counter() - start) / len(updates)
+
+
+def main():
+    warnings.simplefilter("ignore")
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROUNDS
+
+    legacy_app = build_app(setup_legacy_handlers)
+    current_app = build_app(setup_all_handlers)
+
+    # Отдельные наборы апдейтов: признаки сообщения не должны переноситься между прогонами
+    legacy_updates = make_updates(rounds)
+    current_updates = make_updates(rounds)
+
+    print(f"{'Вид апдейта':<20}{'до, мкс':>10}{'после, мкс':>12}{'ускорение':>11}")
+    for name in legacy_updates:
+        before = dispatch_cost(legacy_app, legacy_updates[name]) * 1e6
+        after = dispatch_cost(current_app, current_updates[name]) * 1e6
+        print(f"{name:<20}{before:>10.1f}{after:>12.1f}{before / after:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,10 @@
-import json
-import os
 import logging
 import re
 from telegram import Update, ChatMember
 from telegram.ext import ContextTypes
 from utils.users import get_user_id_by_username, register_user
-
-ADMIN_DB = "database/admin_db.json"
+from utils.admins import has_admin_permission, set_admin
+from utils.member_cache import get_chat_member_cached
 
 logging.basicConfig(level=logging.INFO)
 
@@ -19,33 +17,6 @@ def debug_log(message):
         logging.debug(message)
 
 
-def load_admins():
-    if not os.path.exists(ADMIN_DB):
-        return {}
-    with open(ADMIN_DB, 'r', encoding='utf-8') as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-
-
-def save_admins(admins: dict):
-    with open(ADMIN_DB, 'w', encoding='utf-8') as f:
-        json.dump(admins, f, indent=2, ensure_ascii=False)
-
-
-def has_admin_permission(user_id: str, chat_id: str, admins: dict) -> bool:
-    user_id = str(user_id)
-    chat_id = str(chat_id)
-    if chat_id not in admins:
-        return False
-    group_admins = admins[chat_id].get("admins", {})
-    user_data = group_admins.get(user_id)
-    if user_data and user_data.get("level") == "Заместитель Главы":
-        return True
-    return False
-
-
 async def add_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     if not message:
@@ -56,11 +27,9 @@ async def add_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(chat.id)
     chat_title = chat.title or "Без названия"
 
-    admins = load_admins()
-
     try:
-        requester = await context.bot.get_chat_member(chat.id, user.id)
-        if requester.status != ChatMember.OWNER and not has_admin_permission(user.id, chat_id, admins):
+        requester = await get_chat_member_cached(context.bot, chat.id, user.id)
+        if requester.status != ChatMember.OWNER and not has_admin_permission(user.id, chat_id):
             await message.reply_text("У вас нет прав для выполнения этой команды.")
             return
     except Exception as e:
@@ -132,7 +101,7 @@ async def add_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
-        target_status = await context.bot.get_chat_member(chat.id, int(target_user_id))
+        target_status = await get_chat_member_cached(context.bot, chat.id, int(target_user_id))
         if target_status.status == ChatMember.OWNER:
             await message.reply_text("Нельзя назначить владельца группы администратором.")
             return
@@ -141,20 +110,7 @@ async def add_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await message.reply_text("Не удалось получить статус пользователя.")
         return
 
-    if chat_id not in admins:
-        admins[chat_id] = {
-            "group_title": chat_title,
-            "admins": {}
-        }
-
-    already_admin = target_user_id in admins[chat_id]["admins"]
-
-    admins[chat_id]["admins"][target_user_id] = {
-        "username": username if username else None,
-        "level": level
-    }
-
-    save_admins(admins)
+    already_admin = set_admin(chat_id, chat_title, target_user_id, username, level)
 
     mention = f"@{username}" if username else f"<a href='tg://user?id={target_user_id}'>Пользователь</a>"
     msg = f"{mention} назначен администратором уровня: <b>{level}</b>"
@@ -1,30 +1,14 @@
-import json
-import os
 import re
+import time
 from datetime import datetime, timedelta
 from telegram import Update, ChatMember
 from telegram.ext import ContextTypes
 from utils.users import get_user_id_by_username
-from asyncio import create_task, sleep
 from handlers.admin.cooldown_admin import check_cooldown, update_cooldown
-
-ADMIN_DB = "database/admin_db.json"
-
-
-def load_admins():
-    if not os.path.exists(ADMIN_DB):
-        return {}
-    with open(ADMIN_DB, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except:
-            return {}
-
-
-def get_admin_level(user_id: str, chat_id: str, admins: dict) -> str:
-    if chat_id in admins and user_id in admins[chat_id].get("admins", {}):
-        return admins[chat_id]["admins"][user_id].get("level", "")
-    return ""
+from handlers.group_stats_updater import update_ban_stat
+from utils.admins import get_admin_level
+from utils.member_cache import get_chat_member_cached, invalidate_member
+from utils.scheduled_actions import register_action, schedule_action
 
 
 def parse_duration(text: str):
@@ -49,12 +33,14 @@ def parse_duration(text: str):
     return total_seconds, ', '.join(readable)
 
 
-async def unban_after_delay(context, chat_id, user_id, delay):
-    await sleep(delay)
-    try:
-        await context.bot.unban_chat_member(chat_id, int(user_id), only_if_banned=True)
-    except Exception:
-        pass
+# Отложенный разбан — выполняется очередью utils/scheduled_actions.py (переживает перезапуск)
+async def unban_action(bot, payload):
+    chat_id, user_id = payload["chat_id"], payload["user_id"]
+    await bot.unban_chat_member(chat_id, int(user_id), only_if_banned=True)
+    invalidate_member(chat_id, user_id)
+
+
+register_action("unban", unban_action)
 
 
 async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -66,7 +52,6 @@ async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     chat_id = str(chat.id)
     user_id = str(user.id)
-    admins = load_admins()
 
     parts = message.text.strip().split(maxsplit=2)
     if not parts or len(parts) < 2:
@@ -74,8 +59,8 @@ async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Проверка кулдауна через функции из coldown_admin.py
-    admin_level = get_admin_level(user_id, chat_id, admins)
-    remaining = check_cooldown(chat_id, user_id, admin_level)
+    admin_level = get_admin_level(chat_id, user_id)
+    remaining = check_cooldown(chat_id, user_id)
     if remaining:
         await message.reply_text(f"⏳ Подождите {remaining} до следующего использования !ban.")
         return
@@ -117,9 +102,9 @@ async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Проверка прав вызывающего
     try:
-        requester_status = await context.bot.get_chat_member(chat.id, user.id)
+        requester_status = await get_chat_member_cached(context.bot, chat.id, user.id)
         if requester_status.status != ChatMember.OWNER:
-            requester_level = get_admin_level(str(user.id), chat_id, admins)
+            requester_level = get_admin_level(chat_id, user.id)
             if requester_level not in ["Соруководитель", "Заместитель Главы"]:
                 await message.reply_text("⛔ У вас нет прав для выполнения этой команды.")
                 return
@@ -129,7 +114,7 @@ async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Нельзя банить владельца
     try:
-        target_status = await context.bot.get_chat_member(chat.id, int(target_user_id))
+        target_status = await get_chat_member_cached(context.bot, chat.id, int(target_user_id))
         if target_status.status == ChatMember.OWNER:
             await message.reply_text("Нельзя забанить владельца группы.")
             return
@@ -138,8 +123,8 @@ async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Получаем уровни администраторов
-    requester_level = get_admin_level(str(user.id), chat_id, admins)
-    target_level = get_admin_level(str(target_user_id), chat_id, admins)
+    requester_level = admin_level
+    target_level = get_admin_level(chat_id, target_user_id)
 
     # Соруководитель не может банить другого соруководителя или заместителя
     if requester_level == "Соруководитель" and target_level in ["Соруководитель", "Заместитель Главы"]:
@@ -165,6 +150,7 @@ async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         # Эта строка отвечает за блокировку пользователя
         await context.bot.ban_chat_member(chat.id, int(target_user_id))
+        invalidate_member(chat.id, target_user_id)
 
         mention = f"@{target_username}" if target_username else f"<a href='tg://user?id={target_user_id}'>Пользователь</a>"
         admin_mention = user.mention_html()
@@ -180,7 +166,7 @@ async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             unban_time = datetime.utcnow() + timedelta(seconds=duration_seconds) + timedelta(hours=2)
             formatted = unban_time.strftime('%Y-%m-%d %H:%M:%S GMT+2')
             text += f"\n⏳ Срок: {formatted_duration}\n🔓 Разбан в: <b>{formatted}</b>"
-            create_task(unban_after_delay(context, chat.id, target_user_id, duration_seconds))
+            schedule_action("unban", time.time() + duration_seconds, {"chat_id": chat.id, "user_id": int(target_user_id)})
 
         await message.reply_text(text, parse_mode="HTML")
 
@@ -198,7 +184,10 @@ async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             pass
 
         # Обновляем кулдаун через coldown_admin.py
-        update_cooldown(chat_id, user_id, user.username, group_title)
+        update_cooldown(chat_id, user_id, requester_level)
+
+        # Учитываем бан в статистике группы (страница 3 в !group)
+        update_ban_stat(chat.id, user.id, user.username)
 
     except Exception as e:
         await message.reply_text(f"Ошибка при бане: {e}")
@@ -1,13 +1,16 @@
 # Команда !clear-cmd <N>m — удаляет сообщения от бота и вызовы команд за последние N минут.
 # Поддерживает русскую "м" и латинскую "m".
-# Сохраняет кэш сообщений с автоочисткой каждые 48 часов.
+# Сохраняет кэш сообщений (кольцевой буфер на чат) с автоочисткой записей старше 48 часов.
 # Учитывает уровни доверия, ограничения по времени и количеству сообщений.
 # Переменная DEBUG_CLEAR_CMD управляет логированием (включить True/False).
 
 from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes, MessageHandler, filters
 from datetime import datetime, timedelta, timezone
+import asyncio
 import re
+from utils.rate_limiter import check_rate_limit
 
 # ✅ Включение/отключение отладочной информации
 DEBUG_CLEAR_CMD = True
@@ -18,26 +21,184 @@ TRUSTED_IDS = [5403794760]
 # 📌 Разрешённые роли (если понадобится роль-логика)
 ALLOWED_ROLES = ["владелец", "заместитель", "соруководитель"]
 
-# 🧠 Кэш сообщений: chat_id -> список словарей с инфой о сообщении
+# 📦 Ёмкость кэша на один чат и время жизни записей
+CACHE_CAPACITY = 1000
+CACHE_TTL_SECONDS = 48 * 60 * 60
+
+# Сколько символов текста храним в записи (только для отладочного лога)
+TEXT_PREVIEW_LENGTH = 30
+
+# 🗑 Удаление: до 100 сообщений за один вызов deleteMessages (лимит Bot API)
+DELETE_BATCH_SIZE = 100
+
+# Сколько одиночных delete_message выполняется параллельно, если пакетный вызов не удался
+SINGLE_DELETE_CONCURRENCY = 5
+
+
+class _CachedMessage:
+    """Компактная запись о сообщении (без __dict__)."""
+    __slots__ = ("message_id", "user_id", "is_bot", "text", "date", "deleted")
+
+    def __init__(self, message_id, user_id, is_bot, text, date):
+        self.message_id = message_id
+        self.user_id = user_id
+        self.is_bot = is_bot
+        self.text = text
+        self.date = date  # epoch (секунды, UTC)
+        self.deleted = False
+
+
+class _Ring:
+    """
+    Кольцевой буфер фиксированной ёмкости, упорядоченный по времени.
+    Память выделяется один раз; старые записи перезаписываются новыми,
+    а поиск по времени — бинарный.
+    """
+    __slots__ = ("items", "start", "size")
+
+    def __init__(self, capacity):
+        self.items = [None] * capacity
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        return self.items[(self.start + i) % len(self.items)]
+
+    # Добавить запись; возвращает вытесненную (самую старую) или None
+    def append(self, record):
+        capacity = len(self.items)
+        evicted = None
+        if self.size == capacity:
+            evicted = self.items[self.start]
+            self.start = (self.start + 1) % capacity
+            self.size -= 1
+        self.items[(self.start + self.size) % capacity] = record
+        self.size += 1
+        return evicted
+
+    def popleft(self):
+        record = self.items[self.start]
+        self.items[self.start] = None
+        self.start = (self.start + 1) % len(self.items)
+        self.size -= 1
+        return record
+
+    # Позиция первой записи с date > timestamp (бинарный поиск)
+    def bisect(self, timestamp):
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid].date > timestamp:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    # Записи новее timestamp (от старых к новым)
+    def since(self, timestamp):
+        return [self[i] for i in range(self.bisect(timestamp), self.size)]
+
+    # Удалить записи не новее timestamp; возвращает их количество
+    def drop_until(self, timestamp):
+        count = self.bisect(timestamp)
+        for _ in range(count):
+            self.popleft()
+        return count
+
+
+class _ChatCache:
+    """
+    Кэш одного чата: все сообщения + вторичный индекс сообщений,
+    которые может удалить !clear-cmd (от бота или команды с "!").
+    Индекс хранит только записи, ещё живущие в основном буфере.
+    """
+    __slots__ = ("messages", "commands")
+
+    def __init__(self):
+        self.messages = _Ring(CACHE_CAPACITY)
+        self.commands = _Ring(CACHE_CAPACITY)
+
+    def add(self, record, deletable):
+        evicted = self.messages.append(record)
+        if evicted is not None and len(self.commands) and self.commands[0] is evicted:
+            self.commands.popleft()
+        if deletable:
+            self.commands.append(record)
+
+    def drop_until(self, timestamp):
+        self.commands.drop_until(timestamp)
+        return self.messages.drop_until(timestamp)
+
+
+# 🧠 Кэш сообщений: chat_id -> _ChatCache
 message_cache = {}
 
-# 🕒 Последний вызов команды очистки: chat_id -> datetime
-last_clear_call = {}
-
 # 🧼 Отслеживаем последнее время очистки кэша
 last_cache_reset = datetime.now(timezone.utc)
 
 
-# === 🔁 Автоочистка кэша чата (раз в 48 часов)
+# === 🔁 Автоочистка кэша чата (записи старше 48 часов)
 def cleanup_cache(chat_id):
-    now = datetime.now(timezone.utc)
-    cutoff = now - timedelta(hours=48)
+    cache = message_cache.get(chat_id)
+    if not cache:
+        return
 
-    if chat_id in message_cache:
-        message_cache[chat_id] = [m for m in message_cache[chat_id] if m["date"] > cutoff]
+    cutoff = datetime.now(timezone.utc).timestamp() - CACHE_TTL_SECONDS
+    removed = cache.drop_until(cutoff)
+
+    if DEBUG_CLEAR_CMD:
+        print(f"[КЭШ] Очистка сообщений в чате {chat_id}. Удалено: {removed}, осталось: {len(cache.messages)}")
 
+
+# === 🗑 Пакетное удаление сообщений
+async def delete_messages_batched(bot, chat_id, message_ids):
+    """
+    Удаляет сообщения пачками через deleteMessages (до DELETE_BATCH_SIZE за запрос).
+    Если пакетный запрос не прошёл — пачка удаляется одиночными вызовами
+    с ограниченной параллельностью.
+    Возвращает (удалённые ID, отчёт по пачкам).
+    """
+    deleted_ids = set()
+    report = []
+    semaphore = asyncio.Semaphore(SINGLE_DELETE_CONCURRENCY)
+
+    async def delete_one(message_id):
+        async with semaphore:
+            try:
+                await bot.delete_message(chat_id=chat_id, message_id=message_id)
+                return message_id
+            except TelegramError as e:
+                if DEBUG_CLEAR_CMD:
+                    print(f"[ОШИБКА] Не удалось удалить {message_id}: {e}")
+                return None
+
+    for start in range(0, len(message_ids), DELETE_BATCH_SIZE):
+        batch = message_ids[start:start + DELETE_BATCH_SIZE]
+        batch_result = {"batch": len(report) + 1, "requested": len(batch), "deleted": 0, "mode": "bulk", "error": None}
+
+        try:
+            # deleteMessages молча пропускает уже удалённые/недоступные сообщения
+            await bot.delete_messages(chat_id=chat_id, message_ids=batch)
+            deleted_ids.update(batch)
+            batch_result["deleted"] = len(batch)
+        except TelegramError as e:
+            batch_result["mode"] = "single"
+            batch_result["error"] = str(e)
+            results = await asyncio.gather(*(delete_one(message_id) for message_id in batch))
+            done = [message_id for message_id in results if message_id is not None]
+            deleted_ids.update(done)
+            batch_result["deleted"] = len(done)
+
+        report.append(batch_result)
         if DEBUG_CLEAR_CMD:
-            print(f"[КЭШ] Очистка сообщений в чате {chat_id}. Осталось: {len(message_cache[chat_id])}")
+            print(f"[УДАЛЕНИЕ] Пачка {batch_result['batch']} ({batch_result['mode']}): "
+                  f"{batch_result['deleted']}/{batch_result['requested']}"
+                  + (f" — {batch_result['error']}" if batch_result["error"] else ""))
+
+    return deleted_ids, report
 
 
 # === ⏳ Время до следующей очистки
@@ -70,68 +231,68 @@ async def clear_cmd_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     minutes = int(match.group(1))
 
-    # ⏱ Ограничение по времени (если не доверенный)
-    if user_id not in TRUSTED_IDS:
-        last_call = last_clear_call.get(chat_id)
-        if last_call and now - last_call < timedelta(hours=1):
-            await context.bot.send_message(chat_id=chat_id, text="⏱ Вы можете использовать эту команду раз в час.")
-            return
+    # ⏱ Раз в час на чат (RATE_LIMITS["!clear-cmd"]) — списывается только за корректный вызов
+    if not await check_rate_limit(update, "!clear-cmd", in_handler=True):
+        return
 
     # 🧹 Очистка кэша перед фильтрацией
     cleanup_cache(chat_id)
 
-    # 📦 Фильтрация сообщений из кэша
+    # 📦 Выборка из индекса: только сообщения бота и команды за последние N минут
     deleted_count = 0
-    cutoff_time = now - timedelta(minutes=minutes)
+    report = []
+    cutoff_time = (now - timedelta(minutes=minutes)).timestamp()
 
     if chat_id in message_cache:
         messages_to_delete = [
-            msg for msg in message_cache[chat_id]
-            if msg["date"] > cutoff_time and (
-                msg["user_id"] == context.bot.id or (msg["text"] and msg["text"].startswith("!"))
-            )
+            msg for msg in message_cache[chat_id].commands.since(cutoff_time) if not msg.deleted
         ]
 
         if user_id not in TRUSTED_IDS:
             messages_to_delete = messages_to_delete[-100:]
 
+        deleted_ids, report = await delete_messages_batched(
+            context.bot, chat_id, [msg.message_id for msg in messages_to_delete]
+        )
         for msg in messages_to_delete:
-            try:
-                await context.bot.delete_message(chat_id=chat_id, message_id=msg["message_id"])
-                deleted_count += 1
-                if DEBUG_CLEAR_CMD:
-                    print(f"[УДАЛЕНО] {msg['message_id']}: {msg['text'][:30]}")
-            except Exception as e:
-                if DEBUG_CLEAR_CMD:
-                    print(f"[ОШИБКА] Не удалось удалить {msg['message_id']}: {e}")
-                continue
-
-    last_clear_call[chat_id] = now
+            if msg.message_id in deleted_ids:
+                msg.deleted = True
+        deleted_count = len(deleted_ids)
 
-    await context.bot.send_message(chat_id=chat_id, text=f"✅ Удалено сообщений: {deleted_count}")
+    text = f"✅ Удалено сообщений: {deleted_count}"
+    if len(report) > 1 or any(batch["mode"] == "single" for batch in report):
+        for batch in report:
+            mode = "пакетно" if batch["mode"] == "bulk" else "по одному"
+            text += f"\n• Пачка {batch['batch']}: {batch['deleted']}/{batch['requested']} ({mode})"
+    await context.bot.send_message(chat_id=chat_id, text=text)
 
 
 # === 💾 Кэширование всех сообщений
 async def cache_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        msg = update.effective_message
+        # Только новые сообщения: правка (edited_message) или сообщение под нажатой кнопкой
+        # пришли бы со старой датой и нарушили порядок по времени в кэше (бинарный поиск в _Ring)
+        msg = update.message
         if not msg:
             return
 
         chat_id = msg.chat_id
         if chat_id not in message_cache:
-            message_cache[chat_id] = []
-
-        message_cache[chat_id].append({
-            "message_id": msg.message_id,
-            "user_id": msg.from_user.id if msg.from_user else None,
-            "is_bot": msg.from_user.is_bot if msg.from_user else False,
-            "text": msg.text or "",
-            "date": msg.date
-        })
+            message_cache[chat_id] = _ChatCache()
+
+        text = msg.text or ""
+        user_id = msg.from_user.id if msg.from_user else None
+        record = _CachedMessage(
+            message_id=msg.message_id,
+            user_id=user_id,
+            is_bot=msg.from_user.is_bot if msg.from_user else False,
+            text=text[:TEXT_PREVIEW_LENGTH],
+            date=msg.date.timestamp()
+        )
 
-        if len(message_cache[chat_id]) > 1000:
-            message_cache[chat_id] = message_cache[chat_id][-1000:]
+        # В индекс попадает только то, что может удалить !clear-cmd
+        deletable = user_id == context.bot.id or text.startswith("!")
+        message_cache[chat_id].add(record, deletable)
 
         if DEBUG_CLEAR_CMD:
             print(f"[КЭШ] + {msg.message_id} ({'BOT' if msg.from_user and msg.from_user.is_bot else 'USER'}) — {msg.text or ''}")
@@ -141,6 +302,5 @@ async def cache_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             print(f"[ОШИБКА КЭША] {e}")
 
 
-# === 🔗 Подключение хэндлеров
-clear_cmd_handler_obj = MessageHandler(filters.Regex(r"^!clear-cmd"), clear_cmd_handler)
+# === 🔗 Подключение хэндлеров (!clear-cmd — через диспетчер команд utils/command_router.py)
 cache_handler_obj = MessageHandler(filters.ALL, cache_message)
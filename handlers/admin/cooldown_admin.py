@@ -1,106 +1,167 @@
-import json
+import logging
+import time
 from datetime import datetime
+from utils.admins import LEVEL_DEPUTY, LEVEL_SENIOR, get_admin_level
+from utils.storage import get_store, STORAGE_ERRORS
 
 # Время кулдауна (в секундах)
 COOLDOWN_SECONDS_SENIOR = 3 * 60 * 60  # 3 часа
 COOLDOWN_SECONDS_DEPUTY = 60  # 1 минута
 
+COOLDOWN_SECONDS_BY_LEVEL = {
+    LEVEL_SENIOR: COOLDOWN_SECONDS_SENIOR,
+    LEVEL_DEPUTY: COOLDOWN_SECONDS_DEPUTY,
+}
+
 # Название файла, где хранятся кулдауны
 COOLDOWN_DB = "database/cooldowns.json"
 
+# Как часто (в секундах) из таблицы вычищаются истёкшие кулдауны
+SWEEP_INTERVAL = 10 * 60
+
+# Как часто (в секундах) накопленные изменения сбрасываются на диск
+COOLDOWN_FLUSH_INTERVAL = 30
+
+# 🧠 Таблица кулдаунов в памяти: (chat_id, user_id) -> unix-время окончания
+# В хранилище — компактно: "chat_id:user_id" -> время окончания (одна строка на админа)
+_cooldowns = None
+
+# Ключи (chat_id, user_id), изменившиеся с момента последней записи (поставленные или вычищенные)
+_pending_changes = set()
+
+_last_sweep = 0.0
+
 
-def load_cooldowns():
+def _get_store():
     """
-    Загружает данные из JSON-файла с кулдаунами.
+    Хранилище кулдаунов (utils/storage.py).
     """
-    try:
-        with open(COOLDOWN_DB, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+    return get_store("cooldowns", COOLDOWN_DB)
+
+
+def _row_key(chat_id, user_id) -> str:
+    return f"{chat_id}:{user_id}"
 
 
-def save_cooldowns(cooldowns: dict):
+def _convert_legacy_block(chat_id: str, block: dict, now: float) -> dict:
+    """
+    Старый формат: chat_id -> {"админы": {user_id: {"последнее_использование": ISO, ...}}}.
+    Время окончания считается по текущему уровню админа из реестра.
+    Возвращает действующие кулдауны: (chat_id, user_id) -> время окончания.
+    """
+    active = {}
+    for user_id, info in block.get("админы", {}).items():
+        last_used = info.get("последнее_использование")
+        duration = COOLDOWN_SECONDS_BY_LEVEL.get(get_admin_level(chat_id, user_id))
+        if not last_used or not duration:
+            continue
+        # В старом формате время записывалось через datetime.utcnow() (без часового пояса)
+        last_used_ts = (datetime.fromisoformat(last_used) - datetime(1970, 1, 1)).total_seconds()
+        expires_at = last_used_ts + duration
+        if expires_at > now:
+            active[(chat_id, user_id)] = expires_at
+    return active
+
+
+def _get_table() -> dict:
     """
-    Сохраняет данные в JSON-файл с отступами и без ASCII-escape,
-    чтобы в тексте нормально отображались эмодзи и кириллица.
+    Загружает таблицу один раз; истёкшие записи и старый формат вычищаются из хранилища.
     """
-    with open(COOLDOWN_DB, "w", encoding="utf-8") as f:
-        json.dump(cooldowns, f, indent=2, ensure_ascii=False)
+    global _cooldowns
+    if _cooldowns is None:
+        store = _get_store()
+        now = time.time()
+        table = {}
+        converted = {}
+        stale_keys = []
+        for key, value in store.load().items():
+            if isinstance(value, dict):
+                converted.update(_convert_legacy_block(key, value, now))
+                stale_keys.append(key)
+                continue
+            chat_id, _, user_id = key.rpartition(":")
+            if value > now:
+                table[(chat_id, user_id)] = value
+            else:
+                stale_keys.append(key)
+
+        for key in stale_keys:
+            store.delete(key)
+        table.update(converted)
+        store.put_many({_row_key(*key): expires_at for key, expires_at in converted.items()})
+        if converted:
+            logging.info(f"[COOLDOWNS] Перенесено из старого формата: {len(converted)}")
+        _cooldowns = table
+    return _cooldowns
+
+
+def _sweep(now: float):
+    """
+    Удаляет истёкшие кулдауны (не чаще раза в SWEEP_INTERVAL).
+    """
+    global _last_sweep
+    if now - _last_sweep < SWEEP_INTERVAL:
+        return
+    _last_sweep = now
+    table = _get_table()
+    for key in [k for k, expires_at in table.items() if expires_at <= now]:
+        del table[key]
+        _pending_changes.add(key)
 
 
-def check_cooldown(chat_id: str, user_id: str, admin_level: str):
+def check_cooldown(chat_id: str, user_id: str):
     """
     Проверяет, есть ли ещё «остаток» кулдауна для данного админа.
     Если кулдаун не истёк, возвращает строку вида '1 ч 2 мин 5 сек'.
     Если кулдауна нет — возвращает None.
     """
-    data = load_cooldowns()
-    now = datetime.utcnow()
-
-    # Проверяем, есть ли данные по данному чату
-    if chat_id not in data:
+    now = time.time()
+    _sweep(now)
+    expires_at = _get_table().get((str(chat_id), str(user_id)))
+    if not expires_at or expires_at <= now:
         return None
 
-    # И есть ли в этом чате записи по админам
-    admins_block = data[chat_id].get("админы")
-    if not admins_block or user_id not in admins_block:
-        return None
-
-    # Берём поле "последнее_использование" и вычисляем, сколько времени прошло
-    last_used_str = admins_block[user_id].get("последнее_использование")
-    if not last_used_str:
-        return None
+    hrs, rem = divmod(int(expires_at - now), 3600)
+    mins, secs = divmod(rem, 60)
+    parts = []
+    if hrs: parts.append(f"{hrs} ч")
+    if mins: parts.append(f"{mins} мин")
+    if secs: parts.append(f"{secs} сек")
+    return ' '.join(parts) or "1 сек"
 
-    last_time = datetime.fromisoformat(last_used_str)
-    delta = now - last_time
-    remaining = 0
 
-    # Логика по уровням админов и кулдаун-секундам
-    if admin_level == "Соруководитель" and delta.total_seconds() < COOLDOWN_SECONDS_SENIOR:
-        remaining = COOLDOWN_SECONDS_SENIOR - delta.total_seconds()
-    elif admin_level == "Заместитель Главы" and delta.total_seconds() < COOLDOWN_SECONDS_DEPUTY:
-        remaining = COOLDOWN_SECONDS_DEPUTY - delta.total_seconds()
-
-    if remaining > 0:
-        hrs, rem = divmod(int(remaining), 3600)
-        mins, secs = divmod(rem, 60)
-        parts = []
-        if hrs: parts.append(f"{hrs} ч")
-        if mins: parts.append(f"{mins} мин")
-        if secs: parts.append(f"{secs} сек")
-        return ' '.join(parts)
-
-    return None
+def update_cooldown(chat_id: str, user_id: str, admin_level: str):
+    """
+    Запускает кулдаун админа после использования !ban (длительность зависит от уровня).
+    Запись в хранилище — отложенная, пачкой (flush_cooldowns).
+    """
+    duration = COOLDOWN_SECONDS_BY_LEVEL.get(admin_level)
+    if not duration:
+        return
+    key = (str(chat_id), str(user_id))
+    _get_table()[key] = time.time() + duration
+    _pending_changes.add(key)
 
 
-def update_cooldown(chat_id: str, user_id: str, admin_username: str, chat_title: str):
+def flush_cooldowns():
     """
-    Записывает в файл новую отметку времени (last_used),
-    а также информацию об администраторе и названии чата.
+    Записывает накопленные изменения: поставленные кулдауны — одной пачкой, вычищенные — удаляются.
     """
-    data = load_cooldowns()
-    now = datetime.utcnow()
-
-    # Если в файле ещё нет информации по этому чату, создаём "блок" для него
-    if chat_id not in data:
-        data[chat_id] = {
-            "Название группы": chat_title,
-            "ID группы": chat_id,
-            "админы": {}
-        }
-
-    # Обновим название группы и ID (вдруг изменилось название, или хотим явно хранить)
-    data[chat_id]["Название группы"] = chat_title
-    data[chat_id]["ID группы"] = chat_id
-
-    # Создаём/обновляем информацию по конкретному админу
-    data[chat_id]["админы"][user_id] = {
-        "имя_админа": admin_username,
-        "ID админа": user_id,
-        "Описание": "⌛ Кулдаун после использования !ban",
-        "последнее_использование": now.isoformat()
-    }
-
-    # Сохраняем изменения в файл
-    save_cooldowns(data)
+    if not _pending_changes or _cooldowns is None:
+        return
+    store = _get_store()
+    try:
+        store.put_many({_row_key(*key): _cooldowns[key] for key in _pending_changes if key in _cooldowns})
+        for key in _pending_changes:
+            if key not in _cooldowns:
+                store.delete(_row_key(*key))
+    except STORAGE_ERRORS as e:
+        logging.error(f"Ошибка записи кулдаунов: {type(e).__name__} - {e}")
+        return
+    logging.debug(f"[COOLDOWNS] Записано изменений: {len(_pending_changes)}")
+    _pending_changes.clear()
+
+
+# Задача для JobQueue — периодический сброс кулдаунов на диск
+async def flush_cooldowns_job(context):
+    flush_cooldowns()
@@ -1,19 +1,6 @@
-import json
-import os
 from telegram import Update
 from telegram.ext import ContextTypes
-
-ADMIN_DB = "database/admin_db.json"
-
-
-def load_admins():
-    if not os.path.exists(ADMIN_DB):
-        return {}
-    with open(ADMIN_DB, 'r', encoding='utf-8') as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
+from utils.admins import get_group_admins, get_group_title
 
 
 async def list_admins_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -22,14 +9,13 @@ async def list_admins_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     chat_id = str(update.effective_chat.id)
-    admins = load_admins()
+    group_admins = get_group_admins(chat_id)
 
-    if chat_id not in admins or not admins[chat_id]["admins"]:
+    if not group_admins:
         await message.reply_text("В этой группе пока нет назначенных администраторов.")
         return
 
-    group_admins = admins[chat_id]["admins"]
-    title = admins[chat_id].get("group_title", "Без названия")
+    title = get_group_title(chat_id)
 
     # Сортируем по категориям
     categories = {
@@ -1,35 +1,8 @@
-import json
-import os
 from telegram import Update, ChatMember
 from telegram.ext import ContextTypes
 from utils.users import get_user_id_by_username
-
-ADMIN_DB = "database/admin_db.json"
-
-
-def load_admins():
-    if not os.path.exists(ADMIN_DB):
-        return {}
-    with open(ADMIN_DB, 'r', encoding='utf-8') as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-
-
-def save_admins(admins: dict):
-    with open(ADMIN_DB, 'w', encoding='utf-8') as f:
-        json.dump(admins, f, indent=2, ensure_ascii=False)
-
-
-def has_admin_permission(user_id: str, chat_id: str, admins: dict) -> bool:
-    if chat_id not in admins:
-        return False
-    group_admins = admins[chat_id].get("admins", {})
-    user_data = group_admins.get(str(user_id))
-    if user_data and user_data.get("level") == "Заместитель Главы":
-        return True
-    return False
+from utils.admins import get_group_admins, has_admin_permission, remove_admin
+from utils.member_cache import get_chat_member_cached
 
 
 async def remove_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -41,18 +14,16 @@ async def remove_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     user = update.effective_user
     chat_id = str(chat.id)
 
-    admins = load_admins()  # ✅ Загрузка базы ДО проверки прав
-
     try:
-        requester = await context.bot.get_chat_member(chat.id, user.id)
-        if requester.status != ChatMember.OWNER and not has_admin_permission(str(user.id), chat_id, admins):
+        requester = await get_chat_member_cached(context.bot, chat.id, user.id)
+        if requester.status != ChatMember.OWNER and not has_admin_permission(user.id, chat_id):
             await message.reply_text("У вас нет прав для выполнения этой команды.")
             return
     except Exception:
         await message.reply_text("Ошибка проверки прав.")
         return
 
-    if chat_id not in admins or not admins[chat_id]["admins"]:
+    if not get_group_admins(chat_id):
         await message.reply_text("В этой группе нет администраторов для удаления.")
         return
 
@@ -85,13 +56,11 @@ async def remove_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         await message.reply_text("Укажите пользователя для удаления: через ответ, ID или @.")
         return
 
-    if target_user_id not in admins[chat_id]["admins"]:
+    removed_admin = remove_admin(chat_id, target_user_id)
+    if removed_admin is None:
         await message.reply_text("Этот пользователь не является администратором.")
         return
 
-    removed_admin = admins[chat_id]["admins"].pop(target_user_id)
-    save_admins(admins)
-
     mention = (
         f"@{target_username}" if target_username else f"<a href='tg://user?id={target_user_id}'>Пользователь</a>"
     )
@@ -1,6 +1,10 @@
 import os
+import tempfile
 from telegram import Update, InputFile
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters
+from utils.message_traits import BANG_COMMAND
+from utils.persistence import drain_writes, run_io
+from utils.storage import SQLITE_PATH, snapshot_sqlite
 
 # Пользователи по ID которые имеют права использовать команду !export_db (Проще говоря - Администраторы Бота)
 TRUSTED_USERS = [5403794760]
@@ -9,27 +13,42 @@ DATABASE_PATH = "database"
 
 DB_DESCRIPTIONS = {
     "admin_db.json": "Информация о администраторах группы и уровнях доступа.",
-    "chat_history.json": "История личных сообщений Пользователей с Ботом",
+    "chat_history": "Журнал личных сообщений Пользователей с Ботом (сегмент)",
     "cooldowns.json": "Время повторного использования Административных Команд бота в разных Группах",
     "users.json": "Связка username и ID пользователей.",
+    "group_stats.json": "Статистика групп: сообщения, активные участники и баны по дням.",
+    "scheduled_actions.json": "Очередь отложенных действий бота (разбаны по истечении срока).",
+    "bot": "База SQLite со всеми данными бота (при STORAGE_BACKEND=sqlite).",
     "roulette_lobbies.json": "Активные лобби игры 'Русская рулетка'.",
     "roulette_settings.json": "Настройки игры 'Русская рулетка' по группам.",
 }
 
+# Служебные файлы SQLite (WAL и индекс WAL) — их содержимое попадает в снимок самой базы
+SQLITE_SIDECAR_SUFFIXES = ("-wal", "-shm", "-journal")
+
 WAITING_FOR_CHOICE = 0
 
 
+# Файлы, которые можно выгрузить
+def list_export_files():
+    return [
+        name for name in os.listdir(DATABASE_PATH)
+        if not name.endswith(SQLITE_SIDECAR_SUFFIXES) and os.path.isfile(os.path.join(DATABASE_PATH, name))
+    ]
+
+
 async def export_db_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     if user_id not in TRUSTED_USERS:
         await update.message.reply_text("❌ Вы не являетесь Администратором этого Бота ❌")
         return ConversationHandler.END
 
-    files = os.listdir(DATABASE_PATH)
+    files = list_export_files()
     files_text = "🗃 <b>Файлы базы данных:</b>\n\n"
 
     for filename in files:
-        desc = DB_DESCRIPTIONS.get(filename, "Описание отсутствует.")
+        # Сегменты журналов (chat_history.000001.jsonl и т.п.) описываются по префиксу
+        desc = DB_DESCRIPTIONS.get(filename) or DB_DESCRIPTIONS.get(filename.split(".")[0], "Описание отсутствует.")
         files_text += f"📄 <code>{filename}</code>\n- <i>{desc}</i>\n\n"
 
     files_text += (
@@ -44,7 +63,16 @@ async def export_db_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def send_real_file(context, chat_id, file_path, file_name):
+    # Отложенные изменения дописываются на диск, чтобы в выгрузку попало всё
+    await drain_writes()
+    snapshot_path = None
     try:
+        if os.path.abspath(file_path) == os.path.abspath(SQLITE_PATH):
+            # База SQLite отправляется согласованным снимком (с учётом WAL), снятым в потоке записи
+            fd, snapshot_path = tempfile.mkstemp(suffix=".sqlite3")
+            os.close(fd)
+            await run_io(snapshot_sqlite, snapshot_path)
+            file_path = snapshot_path
         with open(file_path, "rb") as f:
             await context.bot.send_document(
                 chat_id=chat_id,
@@ -52,12 +80,15 @@ async def send_real_file(context, chat_id, file_path, file_name):
             )
     except Exception as e:
         await context.bot.send_message(chat_id=chat_id, text=f"⚠️ Ошибка при отправке {file_name}: {e}")
+    finally:
+        if snapshot_path:
+            os.remove(snapshot_path)
 
 
 async def export_db_choice_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     choice = message.text.strip()
-    files = os.listdir(DATABASE_PATH)
+    files = list_export_files()
     prompt_id = context.user_data.get("export_prompt_id")
 
     is_reply = (
@@ -95,7 +126,7 @@ async def export_db_timeout(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # Версия с ожиданием выбора файла
 export_db_conv_handler = ConversationHandler(
-    entry_points=[MessageHandler(filters.Regex(r"^!export_db$"), export_db_handler)],
+    entry_points=[MessageHandler(BANG_COMMAND & filters.Regex(r"^!export_db$"), export_db_handler)],
     states={
         WAITING_FOR_CHOICE: [
             MessageHandler(filters.TEXT & ~filters.COMMAND, export_db_choice_handler)
@@ -121,7 +152,7 @@ async def export_db_handler_immediate(update: Update, context: ContextTypes.DEFA
         return  # если нет аргументов, пусть сработает обычный handler
 
     arg = parts[1]
-    files = os.listdir(DATABASE_PATH)
+    files = list_export_files()
 
     if arg == "all":
         for file in files:
@@ -2,8 +2,9 @@ import os
 import sys
 import time
 from telegram import Update
-from telegram.ext import ContextTypes, MessageHandler, filters
+from telegram.ext import ContextTypes
 from datetime import datetime
+from utils.setup_jobqueue import flush_persistent_state
 
 # 🔐 ID пользователей, которым разрешён перезапуск
 TRUSTED_IDS = [5403794760]
@@ -35,6 +36,9 @@ async def restart_bot_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     await update.message.reply_text("🔁 Перезапускаю бота...")
 
+    # os.execl не вызывает post_shutdown — сохраняем резидентные данные вручную
+    flush_persistent_state()
+
     # Корректно закрываем соединение
     await context.bot.close()
 
@@ -67,6 +71,3 @@ async def on_bot_start(app):
         # Очищаем инфу после отправки
         restart_info["start_time"] = None
 
-
-# 🎯 Telegram-хэндлер
-restart_handler = MessageHandler(filters.TEXT & filters.Regex(r"^!restart$"), restart_bot_handler)
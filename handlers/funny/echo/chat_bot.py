@@ -1,21 +1,20 @@
 import re
-import json
 from datetime import datetime
 from telegram import Update
 from telegram.ext import (
     ContextTypes
 )
+from utils.chat_journal import append_entry, iter_user_entries, get_distinct_users, read_journal
 
 import logging
 logger = logging.getLogger(__name__)
 
 ADMIN_ID = 5403794760  # Замените на ваш реальный ID
-CHAT_HISTORY_FILE = "database/chat_history.json"
 
 
 def log_message(user_id: int, sender_id: str, sender_name: str, message_type: str, content: str):
     """
-    Записывает сообщение в chat_history.json.
+    Дописывает сообщение в журнал переписки (utils/chat_journal.py).
     - user_id: ID пользователя, чей диалог с ботом ведётся
     - sender_id: 'BOT' (или 'ADMIN'), либо реальный ID пользователя, который отправил сообщение
     - sender_name: имя отправителя (для бота можно указать 'BOT')
@@ -32,15 +31,9 @@ def log_message(user_id: int, sender_id: str, sender_name: str, message_type: st
     }
 
     try:
-        with open(CHAT_HISTORY_FILE, "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except Exception:
-        logs = []
-
-    logs.append(log_entry)
-
-    with open(CHAT_HISTORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(logs, f, indent=2, ensure_ascii=False)
+        append_entry(log_entry)
+    except OSError as e:
+        logger.error(f"Ошибка записи в журнал сообщений: {e}")
 
 
 async def private_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -264,20 +257,9 @@ async def export_users_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text("У вас нет прав для использования этой команды.")
         return
 
-    try:
-        with open(CHAT_HISTORY_FILE, "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except Exception:
-        logs = []
-
-    users = {}
-    for entry in logs:
-        uid = entry.get("user_id")
-        sender_name = entry.get("sender_name")
-        # Просто запомним последнего sender_name, связанного с этим user_id
-        # (обычно это будет имя пользователя, но если sender_id="BOT", это не затронет user_id)
-        if uid not in users:
-            users[uid] = sender_name
+    # Таблица уникальных пользователей поддерживается журналом при каждой записи
+    # (для каждого user_id хранится sender_name из первой записи)
+    users = await read_journal(get_distinct_users)
 
     lines = []
     for uid, name in users.items():
@@ -314,14 +296,9 @@ async def export_chat_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     target_user_id = args[0]
-    try:
-        with open(CHAT_HISTORY_FILE, "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except Exception:
-        logs = []
 
-    # Фильтруем все записи, где user_id совпадает с target_user_id
-    filtered = [entry for entry in logs if entry.get("user_id") == str(target_user_id)]
+    # Читаем по индексу только записи, где user_id совпадает с target_user_id (в потоке записи)
+    filtered = await read_journal(lambda: list(iter_user_entries(target_user_id)))
     if not filtered:
         await update.message.reply_text("Нет сообщений для этого пользователя.")
         return
@@ -1,12 +1,30 @@
 import random
-from asyncio import sleep
+import time
 from telegram import Update, ChatPermissions
 from telegram.ext import ContextTypes
+from utils.scheduled_actions import register_action, schedule_action
 
 # Настройки
 MUTE_CHANCE = 0.01   # 0.01 = это 1% шанс / 0.1 = 10% шанс / 0.005 = 0.5% шанс
 MUTE_DURATION = 60   # в секундах
 
+# Telegram сам снимает ограничение по until_date, если срок от 30 секунд до 366 дней
+# (иначе ограничение считается бессрочным — тогда снимаем его через очередь действий)
+SERVER_EXPIRY_MIN = 30
+SERVER_EXPIRY_MAX = 366 * 24 * 60 * 60
+
+
+# Снятие мута — выполняется очередью utils/scheduled_actions.py
+async def unmute_action(bot, payload):
+    await bot.restrict_chat_member(
+        payload["chat_id"],
+        payload["user_id"],
+        permissions=ChatPermissions(can_send_messages=True)
+    )
+
+
+register_action("unmute", unmute_action)
+
 
 async def mute_random_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
@@ -19,22 +37,19 @@ async def mute_random_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     # Рандомный шанс
     if random.random() < MUTE_CHANCE:
         try:
-            # Мут на 1 минуту
+            server_expiry = SERVER_EXPIRY_MIN <= MUTE_DURATION <= SERVER_EXPIRY_MAX
+            mute_until = int(time.time()) + MUTE_DURATION
+
+            # Мут на MUTE_DURATION секунд — снимется на стороне Telegram, хэндлер не ждёт
             await context.bot.restrict_chat_member(
                 chat_id,
                 user_id,
                 permissions=ChatPermissions(can_send_messages=False),
-                until_date=message.date.timestamp() + MUTE_DURATION
+                until_date=mute_until if server_expiry else None
             )
+            if not server_expiry:
+                schedule_action("unmute", mute_until, {"chat_id": chat_id, "user_id": user_id})
 
             await message.reply_text("Лошарам слово не давали :D")
-
-            # Через минуту снимаем мут
-            await sleep(MUTE_DURATION)
-            await context.bot.restrict_chat_member(
-                chat_id,
-                user_id,
-                permissions=ChatPermissions(can_send_messages=True)
-            )
         except Exception as e:
             print(f"[mute_random_handler] Ошибка: {e}")
@@ -1,67 +1,230 @@
 # handlers/funny/russian_roulette.py
 
-import json
-import asyncio
 import random
 from telegram import Update
 from telegram.ext import ContextTypes
-from datetime import datetime
 from utils.users import get_user_id_by_username
+from utils.outbound_scheduler import LANE_GAME
 
 LOBBY_DB = "database/roulette_lobbies.json"
 SETTINGS_DB = "database/roulette_settings.json"
 
+# Время на регистрацию в лобби и на ход (в секундах)
+LOBBY_TIMEOUT = 2 * 60
+TURN_TIMEOUT = 60
+
+# Патроны в барабане
+BLANKS = 5
+LIVES = 1
+
+STATE_LOBBY = "lobby"
+STATE_ACTIVE = "active"
+STATE_FINISHED = "finished"
+
+# 🎲 Игры по чатам: chat_id -> RouletteGame
+_games = {}
+
+
+def _mention(game, user_id):
+    return f"<a href='tg://user?id={user_id}'>@{game.player_names.get(user_id, 'Игрок')}</a>"
+
+
+class RouletteGame:
+    """
+    Игра в одном чате: лобби -> активная игра -> завершена.
+
+    Переходы меняют только состояние и возвращают тексты для сообщения хода — отправка
+    в хэндлерах. У игры один таймер (Job из JobQueue): истечение лобби или время на ход.
+    Новый таймер всегда отменяет предыдущий, поэтому сколько бы ходов ни прошло,
+    у игры ровно одна ожидающая задача.
+    """
+    __slots__ = ("chat_id", "state", "host", "players", "player_names", "alive", "dead",
+                 "bullets", "original_bullets", "current_index", "waiting", "timer")
+
+    def __init__(self, chat_id, host_id, host_name):
+        self.chat_id = chat_id
+        self.state = STATE_LOBBY
+        self.host = host_id
+        self.players = [host_id]
+        self.player_names = {host_id: host_name}
+        self.alive = []
+        self.dead = []
+        self.bullets = []
+        self.original_bullets = []
+        self.current_index = 0
+        self.waiting = None  # Чей сейчас ход (None — ход обрабатывается)
+        self.timer = None
+
+    # === Таймер ===
+    def set_timer(self, job_queue, callback, delay):
+        self.cancel_timer()
+        self.timer = job_queue.run_once(callback, delay, data=self, name=f"roulette_{self.chat_id}")
+
+    def cancel_timer(self):
+        if self.timer is not None:
+            self.timer.schedule_removal()
+            self.timer = None
+
+    # === Лобби ===
+    def join(self, user_id, name) -> bool:
+        if user_id in self.players:
+            return False
+        self.players.append(user_id)
+        self.player_names[user_id] = name
+        return True
+
+    def start(self, job_queue, parts):
+        bullets = ["blank"] * BLANKS + ["live"] * LIVES
+        random.shuffle(bullets)
+        random.shuffle(self.players)
+
+        self.state = STATE_ACTIVE
+        self.alive = self.players.copy()
+        self.dead = []
+        self.bullets = bullets
+        self.original_bullets = bullets.copy()
+        self.current_index = 0
+        parts.append(self.status_text())
+        self._next_turn_or_end(job_queue, parts)
+
+    # === Ход ===
+    def is_turn(self, user_id) -> bool:
+        return self.state == STATE_ACTIVE and self.waiting == user_id
+
+    def shoot_self(self, job_queue, user_id, parts):
+        self.waiting = None
+        result = self.bullets.pop(0)
+        if result == "blank":
+            parts.append(f"🔫 {_mention(self, user_id)} стреляет в себя — <b>Промах!</b>")
+            parts.append(self.status_text())
+            # После промаха в себя ход остаётся у того же игрока
+            self.waiting = user_id
+            self.set_timer(job_queue, turn_timeout_job, TURN_TIMEOUT)
+            return
+
+        self._kill(user_id)
+        parts.append(f"💥 {_mention(self, user_id)} убит!")
+        parts.append(self.status_text())
+        self._next_turn_or_end(job_queue, parts)
+
+    def shoot(self, job_queue, user_id, target_id, parts):
+        self.waiting = None
+        result = self.bullets.pop(0)
+        shot = f"🔫 {_mention(self, user_id)} выстрелил в {_mention(self, target_id)}"
+        if result == "blank":
+            parts.append(f"{shot} — <b>Промах!</b>")
+            self.current_index = (self.current_index + 1) % len(self.alive)
+        else:
+            self._kill(target_id)
+            parts.append(f"{shot} — 💀 <b>Убит!</b>")
+        parts.append(self.status_text())
+        self._next_turn_or_end(job_queue, parts)
+
+    def _kill(self, user_id):
+        self.dead.append(user_id)
+        self.alive.remove(user_id)
+        self.bullets = self.original_bullets.copy()
+        random.shuffle(self.bullets)
+        if self.current_index >= len(self.alive):
+            self.current_index = 0
+
+    def _next_turn_or_end(self, job_queue, parts):
+        if len(self.alive) == 1:
+            winner_id = self.alive[0]
+            parts.append(f"🏆 Победитель: <a href='tg://user?id={winner_id}'>@{self.player_names.get(winner_id, winner_id)}</a>")
+            self.finish()
+            return
+
+        current_player = self.alive[self.current_index]
+        self.waiting = current_player
+        parts.append(
+            f"🔁 Сейчас ходит: {_mention(self, current_player)}\n"
+            f"Команды: \n<code>!shootme</code> или <code>!shoot @username</code> или ответом на сообщение\n"
+            f"⏳ У тебя {TURN_TIMEOUT} секунд на ход!"
+        )
+        self.set_timer(job_queue, turn_timeout_job, TURN_TIMEOUT)
+
+    def finish(self):
+        self.state = STATE_FINISHED
+        self.waiting = None
+        self.cancel_timer()
+        if _games.get(self.chat_id) is self:
+            del _games[self.chat_id]
+
+    def status_text(self):
+        alive = [_mention(self, pid) for pid in self.alive]
+        dead = [_mention(self, pid) for pid in self.dead]
+        blanks = self.bullets.count("blank")
+        live = self.bullets.count("live")
+        return (
+            f"💥 Патроны: {blanks} холостых, {live} боевых\n"
+            f"🙂 Живые: {len(alive)} — {', '.join(alive)}\n"
+            f"☠️ Мертвые: {len(dead)} — {', '.join(dead) if dead else '—'}"
+        )
 
-# === Авто-таймер хода ===
-async def auto_shoot_timeout(chat_id, context, player_id):
-    await asyncio.sleep(60)
-    lobby = context.chat_data.get(chat_id)
-    if not lobby or lobby.get("waiting") != player_id:
-        return
 
+# === Сообщение хода ===
+# Результат выстрела, статус и приглашение следующему игроку копятся в списке частей
+# и уходят одним сообщением — один запрос к Bot API на ход
+async def send_turn(chat_id, context, parts):
     await context.bot.send_message(
         chat_id=chat_id,
-        text=f"⏱ Время вышло! Игрок <a href='tg://user?id={player_id}'>@{lobby['player_names'][player_id]}</a> сам стреляет в себя",
-        parse_mode="HTML"
+        text="\n\n".join(parts),
+        parse_mode="HTML",
+        rate_limit_args=LANE_GAME
     )
-    await shootme_forced(chat_id, context, player_id)
 
 
-# === Принудительный выстрел в себя ===
-async def shootme_forced(chat_id, context, user_id):
-    lobby = context.chat_data.get(chat_id)
-    if not lobby or lobby["state"] != "active":
+# === Ответ на команду игрока ===
+# Через context.bot: у Message.reply_* нет rate_limit_args, а игровые ответы идут в полосе игр
+async def reply(context, message, text):
+    return await context.bot.send_message(
+        chat_id=message.chat_id,
+        text=text,
+        parse_mode="HTML",
+        reply_to_message_id=message.message_id,
+        rate_limit_args=LANE_GAME
+    )
+
+
+# Игра, которой принадлежит сработавший таймер (None — игра уже завершена или таймер заменён)
+def _game_for_job(context):
+    game = context.job.data
+    if _games.get(game.chat_id) is not game or game.timer is not context.job:
+        return None
+    game.timer = None
+    return game
+
+
+# === Таймер: время на ход вышло — игрок стреляет в себя ===
+async def turn_timeout_job(context: ContextTypes.DEFAULT_TYPE):
+    game = _game_for_job(context)
+    if game is None or game.state != STATE_ACTIVE or game.waiting is None:
         return
 
-    if not lobby["bullets"]:
+    player_id = game.waiting
+    parts = [f"⏱ Время вышло! Игрок {_mention(game, player_id)} сам стреляет в себя"]
+    game.shoot_self(context.job_queue, player_id, parts)
+    await send_turn(game.chat_id, context, parts)
+
+
+# === Таймер: регистрация в лобби закончилась ===
+async def lobby_timeout_job(context: ContextTypes.DEFAULT_TYPE):
+    game = _game_for_job(context)
+    if game is None or game.state != STATE_LOBBY:
         return
 
-    lobby["waiting"] = None
-    result = lobby["bullets"].pop(0)
-    if result == "blank":
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=f"🔫 <a href='tg://user?id={user_id}'>@{lobby['player_names'][user_id]}</a> стреляет в себя — <b>Промах!</b>",
-            parse_mode="HTML"
+    if len(game.players) < 2:
+        game.finish()
+        return await context.bot.send_message(
+            chat_id=game.chat_id,
+            text="⌛ Время регистрации вышло. Недостаточно игроков. Игра отменена.",
+            rate_limit_args=LANE_GAME
         )
-        await show_status(chat_id, context, lobby)
-        lobby["waiting"] = user_id
-        asyncio.create_task(auto_shoot_timeout(chat_id, context, user_id))
-    else:
-        lobby["dead"].append(user_id)
-        lobby["alive"].remove(user_id)
-        lobby["bullets"] = lobby["original_bullets"].copy()
-        random.shuffle(lobby["bullets"])
-        if lobby["current_index"] >= len(lobby["alive"]):
-            lobby["current_index"] = 0
-
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=f"💥 <a href='tg://user?id={user_id}'>@{lobby['player_names'][user_id]}</a> убит!",
-            parse_mode="HTML"
-        )
-        await show_status(chat_id, context, lobby)
-        await next_turn_or_end(chat_id, context, lobby)
+
+    parts = ["⌛ Время регистрации вышло!\n💥 Игра начинается!"]
+    game.start(context.job_queue, parts)
+    await send_turn(game.chat_id, context, parts)
 
 
 # === Завершение игры ===
@@ -70,70 +233,15 @@ async def endgame_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(message.chat_id)
     user_id = str(message.from_user.id)
 
-    lobby = context.chat_data.get(chat_id)
-    if not lobby:
-        return await message.reply_text("Нет активной игры для завершения.")
-
-    if lobby["host"] != user_id:
-        return await message.reply_text("Только хост может завершить игру!")
-
-    del context.chat_data[chat_id]
-    await message.reply_text("❌ Игра была завершена хостом.")
-
-
-# === Проверка: ход игрока ===
-def is_player_turn(chat_id, context, user_id):
-    lobby = context.chat_data.get(chat_id)
-    return (
-        lobby and lobby.get("state") == "active"
-        and lobby.get("waiting") == user_id
-    )
-
+    game = _games.get(chat_id)
+    if not game:
+        return await reply(context, message, "Нет активной игры для завершения.")
 
-# === Показ статуса игры ===
-async def show_status(chat_id, context, lobby):
-    alive = [f"<a href='tg://user?id={pid}'>@{lobby['player_names'][pid]}</a>" for pid in lobby['alive']]
-    dead = [f"<a href='tg://user?id={pid}'>@{lobby['player_names'][pid]}</a>" for pid in lobby['dead']]
-    bullets = lobby.get("bullets", [])
-    blanks = bullets.count("blank")
-    live = bullets.count("live")
-
-    await context.bot.send_message(
-        chat_id=chat_id,
-        text=(
-            f"💥 Патроны: {blanks} холостых, {live} боевых\n"
-            f"🙂 Живые: {len(alive)} — {', '.join(alive)}\n"
-            f"☠️ Мертвые: {len(dead)} — {', '.join(dead) if dead else '—'}"
-        ),
-        parse_mode="HTML"
-    )
+    if game.host != user_id:
+        return await reply(context, message, "Только хост может завершить игру!")
 
-
-# === Следующий ход или конец игры ===
-async def next_turn_or_end(chat_id, context, lobby):
-    if len(lobby["alive"]) == 1:
-        winner_id = lobby["alive"][0]
-        winner_name = lobby["player_names"].get(winner_id, winner_id)
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=f"🏆 Победитель: <a href='tg://user?id={winner_id}'>@{winner_name}</a>",
-            parse_mode="HTML"
-        )
-        del context.chat_data[chat_id]
-    else:
-        current_player = lobby["alive"][lobby["current_index"]]
-        lobby["waiting"] = current_player
-        current_name = lobby["player_names"].get(current_player, "Игрок")
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=(
-                f"🔁 Сейчас ходит: <a href='tg://user?id={current_player}'>@{current_name}</a>\n"
-                f"Команды: \n<code>!shootme</code> или <code>!shoot @username</code> или ответом на сообщение\n"
-                f"⏳ У тебя 60 секунд на ход!"
-            ),
-            parse_mode="HTML"
-        )
-        asyncio.create_task(auto_shoot_timeout(chat_id, context, current_player))
+    game.finish()
+    await reply(context, message, "❌ Игра была завершена хостом.")
 
 
 # === Ход: выстрел в себя ===
@@ -142,12 +250,13 @@ async def shootme_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(message.chat_id)
     user_id = str(message.from_user.id)
 
-    if not is_player_turn(chat_id, context, user_id):
-        return await message.reply_text("⛔ Сейчас не ваш ход!")
+    game = _games.get(chat_id)
+    if not game or not game.is_turn(user_id):
+        return await reply(context, message, "⛔ Сейчас не ваш ход!")
 
-    lobby = context.chat_data.get(chat_id)
-    lobby["waiting"] = None  # сбрасываем таймер немедленно
-    await shootme_forced(chat_id, context, user_id)
+    parts = []
+    game.shoot_self(context.job_queue, user_id, parts)
+    await send_turn(chat_id, context, parts)
 
 
 # === Ход: выстрел в другого ===
@@ -156,55 +265,29 @@ async def shoot_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(message.chat_id)
     user_id = str(message.from_user.id)
 
-    if not is_player_turn(chat_id, context, user_id):
-        return await message.reply_text("⛔ Сейчас не ваш ход!")
-
-    lobby = context.chat_data.get(chat_id)
-    lobby["waiting"] = None  # сбрасываем таймер перед действиями
+    game = _games.get(chat_id)
+    if not game or not game.is_turn(user_id):
+        return await reply(context, message, "⛔ Сейчас не ваш ход!")
 
     if message.reply_to_message:
-        target_user = message.reply_to_message.from_user
-        target_user_id = str(target_user.id)
+        target_user_id = str(message.reply_to_message.from_user.id)
     else:
         parts = message.text.strip().split()
         if len(parts) < 2 or not parts[1].startswith("@"):
-            return await message.reply_text("Укажите цель через @username или ответом на сообщение.")
+            return await reply(context, message, "Укажите цель через @username или ответом на сообщение.")
 
         username = parts[1][1:]
         target_user_id = get_user_id_by_username(username)
         if not target_user_id:
-            return await message.reply_text("❌ Игрок с таким именем не найден среди живых участников.")
-
-    if target_user_id not in lobby["alive"]:
-        return await message.reply_text("Игрок уже мертв или не участвует в игре.")
-
-    result = lobby["bullets"].pop(0)
-    if result == "blank":
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=(
-                f"🔫 <a href='tg://user?id={user_id}'>@{lobby['player_names'][user_id]}</a> выстрелил в <a href='tg://user?id={target_user_id}'>@{lobby['player_names'][target_user_id]}</a> — <b>Промах!</b>"
-            ),
-            parse_mode="HTML"
-        )
-        lobby["current_index"] = (lobby["current_index"] + 1) % len(lobby["alive"])
-    else:
-        lobby["dead"].append(target_user_id)
-        lobby["alive"].remove(target_user_id)
-        lobby["bullets"] = lobby["original_bullets"].copy()
-        random.shuffle(lobby["bullets"])
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=(
-                f"🔫 <a href='tg://user?id={user_id}'>@{lobby['player_names'][user_id]}</a> выстрелил в <a href='tg://user?id={target_user_id}'>@{lobby['player_names'][target_user_id]}</a> — 💀 <b>Убит!</b>"
-            ),
-            parse_mode="HTML"
-        )
-        if lobby["current_index"] >= len(lobby["alive"]):
-            lobby["current_index"] = 0
+            return await reply(context, message, "❌ Игрок с таким именем не найден среди живых участников.")
+        target_user_id = str(target_user_id)
 
-    await show_status(chat_id, context, lobby)
-    await next_turn_or_end(chat_id, context, lobby)
+    if target_user_id not in game.alive:
+        return await reply(context, message, "Игрок уже мертв или не участвует в игре.")
+
+    parts = []
+    game.shoot(context.job_queue, user_id, target_user_id, parts)
+    await send_turn(chat_id, context, parts)
 
 
 # === Хендлер начала игры !roulette ===
@@ -213,22 +296,18 @@ async def roulette_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(message.chat_id)
     user_id = str(message.from_user.id)
 
-    if chat_id in context.chat_data and context.chat_data[chat_id].get("state") in ["lobby", "active"]:
-        return await message.reply_text("В этой группе уже запущена игра!")
+    if chat_id in _games:
+        return await reply(context, message, "В этой группе уже запущена игра!")
 
-    context.chat_data[chat_id] = {
-        "state": "lobby",
-        "host": user_id,
-        "players": [user_id],
-        "player_names": {user_id: message.from_user.first_name},
-        "joined_time": datetime.now().timestamp()
-    }
+    game = _games[chat_id] = RouletteGame(chat_id, user_id, message.from_user.first_name)
+    game.set_timer(context.job_queue, lobby_timeout_job, LOBBY_TIMEOUT)
 
-    await message.reply_html(
+    await reply(
+        context, message,
         f"🎲 <b>{message.from_user.first_name}</b> предлагает сыграть в <b>Русскую рулетку!</b>\n\n"
         f"Чтобы присоединиться, напишите <code>!join</code>\n"
         f"Хост может начать игру раньше командой <code>!startgame</code>\n"
-        f"⏳ У вас есть 2 минуты на регистрацию!"
+        f"⏳ У вас есть {LOBBY_TIMEOUT // 60} минуты на регистрацию!"
     )
 
 
@@ -237,19 +316,15 @@ async def join_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     chat_id = str(message.chat_id)
     user = message.from_user
-    user_id = str(user.id)
 
-    lobby = context.chat_data.get(chat_id)
-    if not lobby or lobby.get("state") != "lobby":
+    game = _games.get(chat_id)
+    if not game or game.state != STATE_LOBBY:
         return
 
-    if user_id in lobby["players"]:
-        return await message.reply_text("Вы уже в игре!")
-
-    lobby["players"].append(user_id)
-    lobby["player_names"][user_id] = user.first_name
+    if not game.join(str(user.id), user.first_name):
+        return await reply(context, message, "Вы уже в игре!")
 
-    await message.reply_html(f"✅ <b>{user.first_name}</b> присоединился к игре!")
+    await reply(context, message, f"✅ <b>{user.first_name}</b> присоединился к игре!")
 
 
 # === Хендлер запуска игры !startgame ===
@@ -258,33 +333,17 @@ async def start_game_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     chat_id = str(message.chat_id)
     user_id = str(message.from_user.id)
 
-    lobby = context.chat_data.get(chat_id)
-    if not lobby or lobby.get("state") != "lobby":
-        return await message.reply_text("Нет активной лобби для запуска.")
-
-    if lobby["host"] != user_id:
-        return await message.reply_text("Только хост может начать игру.")
-
-    if len(lobby["players"]) < 2:
-        del context.chat_data[chat_id]
-        return await message.reply_text("Недостаточно игроков. Игра отменена.")
-
-    blanks = 5
-    lives = 1
-    bullets = ["blank"] * blanks + ["live"] * lives
-    random.shuffle(bullets)
-
-    random.shuffle(lobby["players"])
-    lobby.update({
-        "state": "active",
-        "alive": lobby["players"].copy(),
-        "dead": [],
-        "bullets": bullets,
-        "original_bullets": bullets.copy(),
-        "current_index": 0,
-        "waiting": None
-    })
-
-    await message.reply_text("💥 Игра начинается!")
-    await show_status(chat_id, context, lobby)
-    await next_turn_or_end(chat_id, context, lobby)
+    game = _games.get(chat_id)
+    if not game or game.state != STATE_LOBBY:
+        return await reply(context, message, "Нет активной лобби для запуска.")
+
+    if game.host != user_id:
+        return await reply(context, message, "Только хост может начать игру.")
+
+    if len(game.players) < 2:
+        game.finish()
+        return await reply(context, message, "Недостаточно игроков. Игра отменена.")
+
+    parts = ["💥 Игра начинается!"]
+    game.start(context.job_queue, parts)
+    await send_turn(chat_id, context, parts)
@@ -1,11 +1,13 @@
 import logging
-import json
 from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatMember
 from telegram.ext import ContextTypes
-
-ADMIN_DB = "database/admin_db.json"
-STATS_DB = "database/group_stats.json"
+from handlers.group_stats_updater import (
+    get_3day_message_count, get_3day_active_users, get_7day_bans,
+    get_top10_users, get_top5_banners
+)
+from utils.admins import ADMIN_DB, get_group_admins
+from utils.member_cache import get_member_count_cached
 
 
 async def group_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -15,7 +17,7 @@ async def group_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     chat = update.effective_chat
     try:
-        member_count = await context.bot.get_chat_member_count(chat.id)
+        member_count = await get_member_count_cached(context.bot, chat.id)
     except Exception as e:
         logging.error(f"Ошибка при получении количества участников: {type(e).__name__} - {e}")
         member_count = "не удалось получить"
@@ -68,11 +70,6 @@ async def group_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
         return
 
     chat = update.effective_chat
-    try:
-        member_count = await context.bot.get_chat_member_count(chat.id)
-    except Exception as e:
-        logging.error(f"Ошибка при получении количества участников: {type(e).__name__} - {e}")
-        member_count = "не удалось получить"
 
     if action == "group_page1":
         next_page = "page1"
@@ -100,6 +97,13 @@ async def group_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
         next_page = current_page
 
     if next_page == "page1":
+        # Количество участников нужно только на первой странице
+        try:
+            member_count = await get_member_count_cached(context.bot, chat.id)
+        except Exception as e:
+            logging.error(f"Ошибка при получении количества участников: {type(e).__name__} - {e}")
+            member_count = "не удалось получить"
+
         text_content = (
             f"📊 <b>Информация о группе:</b>\n"
             f"🏷 Название: {chat.title}\n"
@@ -115,10 +119,9 @@ async def group_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
     elif next_page == "page2":
         text_content = "👮 <b>Администраторы группы:</b>\n\n"
         try:
-            with open(ADMIN_DB, "r", encoding="utf-8") as f:
-                admin_data = json.load(f)
-            if str(chat.id) in admin_data and "admins" in admin_data[str(chat.id)]:
-                all_admins = admin_data[str(chat.id)]["admins"]
+            # Реестр администраторов уже в памяти (utils/admins.py)
+            all_admins = get_group_admins(chat.id)
+            if all_admins is not None:
                 if all_admins:
                     zam_list = []
                     sor_list = []
@@ -163,33 +166,29 @@ async def group_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
             text_content += f"🔄 Обновлено! {datetime.now().strftime('%H:%M:%S')}"
 
     elif next_page == "page3":
-        try:
-            with open(STATS_DB, "r", encoding="utf-8") as f:
-                stats_data = json.load(f)
-            group_stats = stats_data.get(str(chat.id), {})
-            messages = group_stats.get("messages", 0)
-            active = group_stats.get("active_users", 0)
-            bans = group_stats.get("bans", 0)
-        except Exception as e:
-            logging.error(f"Ошибка чтения {STATS_DB}: {e}")
-            messages, active, bans = 0, 0, 0
+        # Счётчики ведёт group_stats_updater в памяти — чтение без обращения к диску
+        messages = get_3day_message_count(chat.id)
+        active = get_3day_active_users(chat.id)
+        bans = get_7day_bans(chat.id)
 
         text_content = (
             "📈 <b>Статистика группы:</b>\n\n"
-            f"✉️ Сообщений за сутки: <b>{messages}</b>\n"
-            f"👥 Активных участников: <b>{active}</b>\n"
+            f"✉️ Сообщений за 3 дня: <b>{messages}</b>\n"
+            f"👥 Активных участников за 3 дня: <b>{active}</b>\n"
             f"⛔️ Бан(ов) за неделю: <b>{bans}</b>\n"
-            
-            """\nПока не работает статистика. Почему? Мне просто - лень.
-            
-            А ну и ещё тут будет тир лист топ 10 самых активных участников в группе (Будут отображены места, и количество сообщений)
-            И топ 5 самых страшных админов, которые больше всех забанили участников за неделю
-            
-            Статистика сообщений - будет разделена на 3 блока. 1 блок - это количество сообщений за день.
-            И так максимум 3 блока. Где потом будет записываться новый блок информации, и перед внесением в статистику его.
-            Самый старый блок удалиться. И такой логикой сможем оценивать актив группы за последние 3 дня ^^
-            """
         )
+
+        top_users = get_top10_users(chat.id)
+        if top_users:
+            text_content += "\n🏆 <b>Топ 10 активных участников (за всё время):</b>\n"
+            for place, name, count in top_users:
+                text_content += f"{place}. {name} — {count} сообщ.\n"
+
+        top_banners = get_top5_banners(chat.id)
+        if top_banners:
+            text_content += "\n👮 <b>Топ 5 самых строгих админов (за всё время):</b>\n"
+            for place, name, count in top_banners:
+                text_content += f"{place}. {name} — {count} бан(ов)\n"
         if action == "group_refresh":
             text_content += f"\n🔄 Обновлено! {datetime.now().strftime('%H:%M:%S')}"
 
@@ -1,146 +1,290 @@
-import json
-import os
+import logging
 from datetime import datetime, timedelta
-from collections import defaultdict
+from telegram import Update
+from telegram.ext import ContextTypes, MessageHandler, filters
+from utils.storage import get_store, STORAGE_ERRORS
 
 STATS_PATH = "database/group_stats.json"
 
+# Сколько дневных блоков хранится (окна статистики)
+MESSAGE_DAYS = 3
+ACTIVE_DAYS = 3
+BAN_DAYS = 7
+
+# Размеры таблиц лидеров
+TOP_USERS_SIZE = 10
+TOP_BANNERS_SIZE = 5
+
+# Как часто (в секундах) снимок статистики записывается на диск
+STATS_FLUSH_INTERVAL = 60
+
+
+class _TopCounters:
+    """
+    Инкрементальный топ-K по счётчикам, которые только растут (message_counters / ban_counters
+    ведутся за всё время, без окна — в отличие от дневных блоков).
+    Хранит не больше K пар [count, uid], отсортированных по убыванию:
+    пользователь вне топа может попасть в него, только обогнав последнего —
+    поэтому обновление стоит O(K) и не зависит от числа участников чата.
+    """
+    __slots__ = ("size", "entries")
+
+    def __init__(self, size, counters):
+        self.size = size
+        top = sorted(counters.items(), key=lambda x: x[1]["count"], reverse=True)[:size]
+        self.entries = [[v["count"], uid] for uid, v in top]
+
+    def update(self, uid, count):
+        entries = self.entries
+        for i, entry in enumerate(entries):
+            if entry[1] == uid:
+                entry[0] = count
+                break
+        else:
+            if len(entries) < self.size:
+                entries.append([count, uid])
+                i = len(entries) - 1
+            elif count > entries[-1][0]:
+                entries[-1] = [count, uid]
+                i = len(entries) - 1
+            else:
+                return
+
+        # Поднимаем обновлённую запись на её место
+        while i > 0 and entries[i - 1][0] < entries[i][0]:
+            entries[i - 1], entries[i] = entries[i], entries[i - 1]
+            i -= 1
+
+
+class _ChatStats:
+    """
+    Резидентные счётчики одного чата.
+    Дневные блоки хранятся как раньше (message_blocks / active_blocks / ban_blocks),
+    а суммы по окну поддерживаются инкрементально — чтение статистики стоит O(1).
+    """
+    __slots__ = (
+        "message_blocks", "active_blocks", "ban_blocks",
+        "message_counters", "ban_counters",
+        "message_total", "ban_total", "active_refs",
+        "top_users", "top_banners"
+    )
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.message_blocks = [dict(b) for b in data.get("message_blocks", [])]
+        self.active_blocks = [
+            {"date": b["date"], "users": set(b.get("users", []))} for b in data.get("active_blocks", [])
+        ]
+        self.ban_blocks = [dict(b) for b in data.get("ban_blocks", [])]
+        self.message_counters = data.get("message_counters", {})
+        self.ban_counters = data.get("ban_counters", {})
+
+        # Суммы по окну: сообщения, баны и "в скольких блоках встречается пользователь"
+        self.message_total = sum(b["count"] for b in self.message_blocks)
+        self.ban_total = sum(b["count"] for b in self.ban_blocks)
+        self.active_refs = {}
+        for block in self.active_blocks:
+            for uid in block["users"]:
+                self.active_refs[uid] = self.active_refs.get(uid, 0) + 1
+
+        # Таблицы лидеров строятся один раз при загрузке, дальше — только инкрементально
+        self.top_users = _TopCounters(TOP_USERS_SIZE, self.message_counters)
+        self.top_banners = _TopCounters(TOP_BANNERS_SIZE, self.ban_counters)
+
+    # Убираем блоки, выпавшие из окна (по дате, а не только по количеству)
+    def expire(self, today: str):
+        message_cutoff = _cutoff_date(today, MESSAGE_DAYS)
+        while self.message_blocks and self.message_blocks[0]["date"] < message_cutoff:
+            self.message_total -= self.message_blocks.pop(0)["count"]
+
+        active_cutoff = _cutoff_date(today, ACTIVE_DAYS)
+        while self.active_blocks and self.active_blocks[0]["date"] < active_cutoff:
+            for uid in self.active_blocks.pop(0)["users"]:
+                self.active_refs[uid] -= 1
+                if not self.active_refs[uid]:
+                    del self.active_refs[uid]
+
+        ban_cutoff = _cutoff_date(today, BAN_DAYS)
+        while self.ban_blocks and self.ban_blocks[0]["date"] < ban_cutoff:
+            self.ban_total -= self.ban_blocks.pop(0)["count"]
+
+    def to_dict(self):
+        return {
+            "message_blocks": self.message_blocks,
+            "active_blocks": [
+                {"date": b["date"], "users": sorted(b["users"])} for b in self.active_blocks
+            ],
+            "ban_blocks": self.ban_blocks,
+            "message_counters": self.message_counters,
+            "ban_counters": self.ban_counters
+        }
+
+
+# 🧠 Резидентная статистика: chat_id -> _ChatStats (загружается с диска один раз)
+_stats = None
+
+# Чаты, изменившиеся с момента последнего снимка
+_dirty_chats = set()
 
-def load_stats():
-    if not os.path.exists(STATS_PATH):
-        return {}
-    with open(STATS_PATH, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
+# Кэш границ окон: (today, days) -> самая ранняя дата, входящая в окно
+_cutoff_cache = {}
 
 
-def save_stats(stats):
-    with open(STATS_PATH, "w", encoding="utf-8") as f:
-        json.dump(stats, f, indent=2, ensure_ascii=False)
+# Хранилище статистики (utils/storage.py): одна запись на группу
+def _get_store():
+    return get_store("group_stats", STATS_PATH)
 
 
 def get_today_date():
     return datetime.utcnow().strftime("%Y-%m-%d")
 
 
-def rotate_blocks(block_list, max_blocks=3):
-    if len(block_list) > max_blocks:
-        block_list.pop(0)
-    return block_list
+def _cutoff_date(today: str, days: int) -> str:
+    key = (today, days)
+    if key not in _cutoff_cache:
+        if len(_cutoff_cache) > 16:
+            _cutoff_cache.clear()
+        first_day = datetime.strptime(today, "%Y-%m-%d") - timedelta(days=days - 1)
+        _cutoff_cache[key] = first_day.strftime("%Y-%m-%d")
+    return _cutoff_cache[key]
 
 
-def update_message_stat(chat_id, user_id, username=None):
-    stats = load_stats()
+def _get_all_stats():
+    global _stats
+    if _stats is None:
+        _stats = {chat_id: _ChatStats(data) for chat_id, data in _get_store().load().items()}
+    return _stats
+
+
+# Статистика чата с уже отброшенными устаревшими блоками (или None, если чата нет)
+def _get_chat(chat_id, create=False):
+    stats = _get_all_stats()
     chat_id = str(chat_id)
-    today = get_today_date()
+    chat = stats.get(chat_id)
+    if chat is None:
+        if not create:
+            return None
+        chat = stats[chat_id] = _ChatStats()
+    chat.expire(get_today_date())
+    return chat
 
-    if chat_id not in stats:
-        stats[chat_id] = {
-            "message_blocks": [],
-            "active_blocks": [],
-            "ban_blocks": [],
-            "message_counters": {},
-            "ban_counters": {}
-        }
 
-    chat = stats[chat_id]
+def update_message_stat(chat_id, user_id, username=None):
+    chat = _get_chat(chat_id, create=True)
+    today = get_today_date()
 
     # === Message block ===
-    if not chat["message_blocks"] or chat["message_blocks"][-1]["date"] != today:
-        chat["message_blocks"].append({"date": today, "count": 0})
-        chat["message_blocks"] = rotate_blocks(chat["message_blocks"], 3)
+    if not chat.message_blocks or chat.message_blocks[-1]["date"] != today:
+        chat.message_blocks.append({"date": today, "count": 0})
 
-    chat["message_blocks"][-1]["count"] += 1
+    chat.message_blocks[-1]["count"] += 1
+    chat.message_total += 1
 
-    # === Active users block ===
-    if not chat["active_blocks"] or chat["active_blocks"][-1]["date"] != today:
-        chat["active_blocks"].append({"date": today, "users": []})
-        chat["active_blocks"] = rotate_blocks(chat["active_blocks"], 3)
+    # === Active users block (set — проверка за O(1)) ===
+    if not chat.active_blocks or chat.active_blocks[-1]["date"] != today:
+        chat.active_blocks.append({"date": today, "users": set()})
 
-    if user_id not in chat["active_blocks"][-1]["users"]:
-        chat["active_blocks"][-1]["users"].append(user_id)
+    today_users = chat.active_blocks[-1]["users"]
+    if user_id not in today_users:
+        today_users.add(user_id)
+        chat.active_refs[user_id] = chat.active_refs.get(user_id, 0) + 1
 
-    # === User weekly message counter ===
+    # === User message counter ===
     uid = str(user_id)
-    if "message_counters" not in chat:
-        chat["message_counters"] = {}
-    if uid not in chat["message_counters"]:
-        chat["message_counters"][uid] = {"count": 0, "username": username or ""}
+    if uid not in chat.message_counters:
+        chat.message_counters[uid] = {"count": 0, "username": username or ""}
 
-    chat["message_counters"][uid]["count"] += 1
+    chat.message_counters[uid]["count"] += 1
     if username:
-        chat["message_counters"][uid]["username"] = username
+        chat.message_counters[uid]["username"] = username
+    chat.top_users.update(uid, chat.message_counters[uid]["count"])
 
-    save_stats(stats)
+    _dirty_chats.add(str(chat_id))
 
 
 def update_ban_stat(chat_id, admin_id, admin_username=None):
-    stats = load_stats()
-    chat_id = str(chat_id)
+    chat = _get_chat(chat_id, create=True)
     today = get_today_date()
 
-    if chat_id not in stats:
-        stats[chat_id] = {
-            "message_blocks": [],
-            "active_blocks": [],
-            "ban_blocks": [],
-            "message_counters": {},
-            "ban_counters": {}
-        }
-
-    chat = stats[chat_id]
-
     # === Ban block ===
-    if not chat["ban_blocks"] or chat["ban_blocks"][-1]["date"] != today:
-        chat["ban_blocks"].append({"date": today, "count": 0})
-        chat["ban_blocks"] = rotate_blocks(chat["ban_blocks"], 7)
+    if not chat.ban_blocks or chat.ban_blocks[-1]["date"] != today:
+        chat.ban_blocks.append({"date": today, "count": 0})
 
-    chat["ban_blocks"][-1]["count"] += 1
+    chat.ban_blocks[-1]["count"] += 1
+    chat.ban_total += 1
 
     # === Admin ban counter ===
     aid = str(admin_id)
-    if aid not in chat["ban_counters"]:
-        chat["ban_counters"][aid] = {"count": 0, "username": admin_username or ""}
+    if aid not in chat.ban_counters:
+        chat.ban_counters[aid] = {"count": 0, "username": admin_username or ""}
 
-    chat["ban_counters"][aid]["count"] += 1
+    chat.ban_counters[aid]["count"] += 1
     if admin_username:
-        chat["ban_counters"][aid]["username"] = admin_username
+        chat.ban_counters[aid]["username"] = admin_username
+    chat.top_banners.update(aid, chat.ban_counters[aid]["count"])
 
-    save_stats(stats)
+    _dirty_chats.add(str(chat_id))
 
 
 def get_3day_message_count(chat_id):
-    stats = load_stats()
-    blocks = stats.get(str(chat_id), {}).get("message_blocks", [])
-    return sum(block["count"] for block in blocks)
+    chat = _get_chat(chat_id)
+    return chat.message_total if chat else 0
 
 
 def get_3day_active_users(chat_id):
-    stats = load_stats()
-    blocks = stats.get(str(chat_id), {}).get("active_blocks", [])
-    users = set()
-    for block in blocks:
-        users.update(block["users"])
-    return len(users)
+    chat = _get_chat(chat_id)
+    return len(chat.active_refs) if chat else 0
 
 
 def get_7day_bans(chat_id):
-    stats = load_stats()
-    blocks = stats.get(str(chat_id), {}).get("ban_blocks", [])
-    return sum(block["count"] for block in blocks)
+    chat = _get_chat(chat_id)
+    return chat.ban_total if chat else 0
+
+
+# Строки таблицы лидеров: (место, username или "ID ...", количество)
+def _render_top(top, counters):
+    return [
+        (i + 1, counters[uid]["username"] or f"ID {uid}", count)
+        for i, (count, uid) in enumerate(top.entries)
+    ]
 
 
 def get_top10_users(chat_id):
-    stats = load_stats()
-    counters = stats.get(str(chat_id), {}).get("message_counters", {})
-    top = sorted(counters.items(), key=lambda x: x[1]["count"], reverse=True)[:10]
-    return [(i + 1, v["username"], v["count"]) for i, (uid, v) in enumerate(top)]
+    chat = _get_chat(chat_id)
+    return _render_top(chat.top_users, chat.message_counters) if chat else []
 
 
 def get_top5_banners(chat_id):
-    stats = load_stats()
-    counters = stats.get(str(chat_id), {}).get("ban_counters", {})
-    top = sorted(counters.items(), key=lambda x: x[1]["count"], reverse=True)[:5]
-    return [(i + 1, v["username"], v["count"]) for i, (uid, v) in enumerate(top)]
+    chat = _get_chat(chat_id)
+    return _render_top(chat.top_banners, chat.ban_counters) if chat else []
+
+
+# Снимок статистики (только изменившиеся группы)
+def flush_stats():
+    if not _dirty_chats or _stats is None:
+        return
+    try:
+        _get_store().put_many({chat_id: _stats[chat_id].to_dict() for chat_id in _dirty_chats})
+    except STORAGE_ERRORS as e:
+        logging.error(f"Ошибка записи статистики групп: {type(e).__name__} - {e}")
+        return
+    _dirty_chats.clear()
+
+
+# Задача для JobQueue — периодический снимок статистики
+async def flush_stats_job(context):
+    flush_stats()
+
+
+# Хэндлер: учёт каждого нового сообщения в группе (правка — не новое сообщение)
+async def group_stats_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    if not update.message or not user or user.is_bot:
+        return
+    update_message_stat(update.effective_chat.id, user.id, user.username)
+
+
+# === 🔗 Подключение хэндлера: только новые сообщения (MessageHandler ловит и edited_message)
+group_stats_handler_obj = MessageHandler(
+    filters.UpdateType.MESSAGE & filters.ChatType.GROUPS & ~filters.StatusUpdate.ALL, group_stats_handler
+)
@@ -1,27 +1,10 @@
 import logging
-import json
-import os
 from telegram import Update, ChatMemberAdministrator
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 from utils.users import get_user_id_by_username, register_user
-
-ADMIN_DB = "database/admin_db.json"
-
-
-def load_admins():
-    if not os.path.exists(ADMIN_DB):
-        return {}
-    with open(ADMIN_DB, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except:
-            return {}
-
-
-def get_admin_level(chat_id, user_id):
-    admins = load_admins()
-    return admins.get(str(chat_id), {}).get("admins", {}).get(str(user_id), {}).get("level", "")
+from utils.admins import get_admin_level
+from utils.member_cache import get_chat_member_cached, invalidate_member
 
 
 async def prefix_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -73,7 +56,7 @@ async def prefix_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Проверка: кто инициатор?
     try:
-        member_info = await context.bot.get_chat_member(chat_id, user_id)
+        member_info = await get_chat_member_cached(context.bot, chat_id, user_id)
         is_owner = member_info.status == "creator"
     except Exception as e:
         logging.error(f"Ошибка get_chat_member (инициатор): {type(e).__name__} - {e}")
@@ -98,7 +81,7 @@ async def prefix_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Проверка цели
     try:
-        target_member = await context.bot.get_chat_member(chat_id, target_user_id)
+        target_member = await get_chat_member_cached(context.bot, chat_id, target_user_id)
         if target_member.status == "creator":
             await message.reply_text("Нельзя изменить префикс создателю группы.")
             return
@@ -141,6 +124,9 @@ async def prefix_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logging.error(f"Ошибка promote_chat_member: {type(e).__name__} - {e}")
         await message.reply_text("Не удалось сохранить права при установке префикса.")
         return
+    finally:
+        # Статус цели мог измениться — следующая проверка пойдёт в Telegram
+        invalidate_member(chat_id, target_user_id)
 
     # Установка префикса
     try:
@@ -1,7 +1,8 @@
-import json
-import os
+from functools import lru_cache
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters
+from utils.member_cache import get_chat_member_cached
+from utils.storage import get_store
 
 RULES_DB = "database/rules_db.json"
 MAX_RULES_PAGES = 10
@@ -9,37 +10,57 @@ MAX_RULES_PAGES = 10
 # Conversation states for ConversationHandler
 ASK_PAGE, ASK_TEXT = range(2)
 
-# Загружаем правила из файла
+# 🧠 Кэш страниц правил: chat_id -> tuple страниц (сбрасывается при изменении правил)
+_rules_cache = {}
 
+# Хранилище правил (utils/storage.py): одна запись на группу — список страниц
 
-def load_rules():
-    if not os.path.exists(RULES_DB):
-        return {}
-    with open(RULES_DB, 'r', encoding='utf-8') as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
 
-# Сохраняем правила в файл
+def _get_store():
+    return get_store("rules", RULES_DB)
 
 
-def save_rules(data):
-    with open(RULES_DB, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+# Страницы правил группы (только для чтения — из кэша)
+
+
+def get_rules(chat_id) -> tuple:
+    chat_id = str(chat_id)
+    pages = _rules_cache.get(chat_id)
+    if pages is None:
+        pages = _rules_cache[chat_id] = tuple(_get_store().get(chat_id, []))
+    return pages
+
+# Страницы правил группы для изменения (копия)
+
+
+def load_rules(chat_id) -> list:
+    return list(get_rules(chat_id))
+
+# Сохраняем страницы правил группы и сбрасываем кэш
+
+
+def save_rules(chat_id, rules: list):
+    _get_store().put(str(chat_id), rules)
+    invalidate_rules(chat_id)
+
+
+def invalidate_rules(chat_id):
+    _rules_cache.pop(str(chat_id), None)
 
 # Получаем текст правил для нужной страницы
 
 
 def get_rules_for_page(chat_id: str, page: int) -> str:
-    rules = load_rules().get(str(chat_id), [])
+    rules = get_rules(chat_id)
     if 0 < page <= len(rules):
         return rules[page - 1]
     return "На сервере в данный момент нету правил."
 
 # Генерируем inline-кнопки с информацией о страницах
+# (клавиатура неизменяема — одна и та же разметка переиспользуется для (user_id, page, total))
 
 
+@lru_cache(maxsize=1024)
 def generate_rules_keyboard(user_id: int, page: int, total_pages: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [
@@ -58,7 +79,7 @@ async def rules_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = str(update.effective_chat.id)
 
-    rules = load_rules().get(chat_id, [])
+    rules = get_rules(chat_id)
     page = 1
     total = max(1, len(rules))
     text = get_rules_for_page(chat_id, page)
@@ -86,7 +107,7 @@ async def rules_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
         return
 
     chat_id = str(update.effective_chat.id)
-    rules = load_rules().get(chat_id, [])
+    rules = get_rules(chat_id)
     total_pages = max(1, len(rules))
 
     if action == "rules_next":
@@ -105,7 +126,7 @@ async def rules_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
 
     await query.edit_message_text(
         text=text,
-        reply_markup=generate_rules_keyboard(sender_id, next_page, total_pages),
+        reply_markup=generate_rules_keyboard(query.from_user.id, next_page, total_pages),
         parse_mode="HTML"
     )
 
@@ -114,7 +135,7 @@ async def rules_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
 async def set_rules_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
     user = update.effective_user
-    member = await context.bot.get_chat_member(chat.id, user.id)
+    member = await get_chat_member_cached(context.bot, chat.id, user.id)
     if member.status != "creator":
         await update.message.reply_text("Только владелец группы может устанавливать правила.")
         return ConversationHandler.END
@@ -128,7 +149,7 @@ async def set_rules_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("Страница должна быть от 1 до 10")
             return ConversationHandler.END
 
-        rules = load_rules().get(context.user_data['chat_id'], [])
+        rules = get_rules(context.user_data['chat_id'])
         if page > len(rules) + 1:
             await update.message.reply_text("Нельзя создать эту страницу — предыдущая ещё пустая")
             return ConversationHandler.END
@@ -151,7 +172,7 @@ async def set_rules_receive_page(update: Update, context: ContextTypes.DEFAULT_T
         return ASK_PAGE
 
     chat_id = context.user_data['chat_id']
-    rules = load_rules().get(chat_id, [])
+    rules = get_rules(chat_id)
 
     if page > len(rules) + 1:
         await update.message.reply_text("Нельзя создавать новую страницу, пока предыдущая не заполнена.")
@@ -165,15 +186,13 @@ async def set_rules_receive_page(update: Update, context: ContextTypes.DEFAULT_T
 async def set_rules_receive_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = context.user_data['chat_id']
     page = context.user_data['page']
-    rules_data = load_rules()
-    rules = rules_data.get(chat_id, [])
+    rules = load_rules(chat_id)
 
     while len(rules) < page:
         rules.append("")
 
     rules[page - 1] = update.message.text.strip()
-    rules_data[chat_id] = rules
-    save_rules(rules_data)
+    save_rules(chat_id, rules)
 
     await update.message.reply_text(f"✅ Правила для страницы {page} сохранены!")
     return ConversationHandler.END
@@ -188,7 +207,7 @@ async def set_rules_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def delete_rules_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
     user = update.effective_user
-    member = await context.bot.get_chat_member(chat.id, user.id)
+    member = await get_chat_member_cached(context.bot, chat.id, user.id)
 
     if member.status != "creator":
         await update.message.reply_text("Удаление разрешено только владельцу группы.")
@@ -201,15 +220,13 @@ async def delete_rules_handler(update: Update, context: ContextTypes.DEFAULT_TYP
 
     page_to_delete = int(args[1])
     chat_id = str(chat.id)
-    rules_data = load_rules()
-    rules = rules_data.get(chat_id, [])
+    rules = load_rules(chat_id)
 
     if not (1 <= page_to_delete <= len(rules)):
         await update.message.reply_text("Страница не существует или уже пуста.")
         return
 
     del rules[page_to_delete - 1]  # Удаление страницы
-    rules_data[chat_id] = rules  # Перезапись
-    save_rules(rules_data)
+    save_rules(chat_id, rules)  # Перезапись
 
     await update.message.reply_text(f"🗑 Страница {page_to_delete} успешно удалена и порядок обновлён.")
\ No newline at end of file
@@ -1,11 +1,12 @@
-import psutil
 import platform
 import time
-import io
-import matplotlib.pyplot as plt
 from datetime import datetime, timedelta, timezone
-from telegram import Update, InputFile
+from telegram import Update
 from telegram.ext import ContextTypes
+from utils.charts import render_bar_chart, remember_file_id
+from utils.command_router import get_command_stats
+from utils.rate_limiter import get_rejection_stats
+from utils.metrics import get_snapshot, get_processes, get_cpu_window, SAMPLE_INTERVAL
 
 # Пользователи с доступом к !status
 ALLOWED_USER_IDS = [5403794760, 5742749531]
@@ -13,9 +14,23 @@ ALLOWED_USER_IDS = [5403794760, 5742749531]
 # Пользователи с доступом к !debug-all
 SUPER_ADMIN_IDS = [5403794760, 5742749531]
 
+# Сколько команд показывать в !debug-all
+TOP_COMMANDS = 5
+
 # Время запуска бота
 start_time = time.time()
 
+NO_METRICS_TEXT = "⏳ Метрики ещё собираются, попробуйте через пару секунд."
+
+
+# График загрузки ядер (рисуется в пуле потоков и кэшируется — см. utils/charts.py)
+async def render_cpu_chart(key, cores, figsize, filename):
+    return await render_bar_chart(
+        key, cores, figsize=figsize,
+        title="Загрузка CPU по ядрам", xlabel="Ядро", ylabel="Загрузка (%)",
+        filename=filename
+    )
+
 
 async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -23,12 +38,21 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⛔ Вы не являетесь Администратором этого Бота ⛔")
         return
 
+    # Данные берём из фонового сборщика (utils/metrics.py) — без блокирующих замеров
+    snapshot = get_snapshot()
+    if snapshot is None:
+        await update.message.reply_text(NO_METRICS_TEXT)
+        return
+
     uptime = timedelta(seconds=int(time.time() - start_time))
-    boot_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(psutil.boot_time()))
-    cpu_percent = psutil.cpu_percent(interval=1)
-    cpu_cores = psutil.cpu_percent(interval=1, percpu=True)
-    ram = psutil.virtual_memory()
-    disk = psutil.disk_usage('/')
+    boot_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot["boot_time"]))
+    cpu_percent = snapshot["cpu"]
+    cpu_cores = snapshot["cores"]
+    ram = snapshot["ram"]
+    disk = snapshot["disk"]
+    window = get_cpu_window()
+    cpu_average = round(sum(sample["cpu"] for sample in window) / len(window), 1)
+    window_seconds = len(window) * SAMPLE_INTERVAL
     system = platform.system()
     machine = platform.machine()
 
@@ -37,7 +61,7 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"🔧 OS: <b>{system}</b> ({machine})\n"
         f"⏱ Аптайм: <code>{uptime}</code>\n"
         f"📆 Запущен: <code>{boot_time}</code>\n"
-        f"📊 CPU: <b>{cpu_percent}%</b>\n"
+        f"📊 CPU: <b>{cpu_percent}%</b> (среднее за {window_seconds} сек: {cpu_average}%)\n"
         f"📦 RAM: <b>{ram.percent}%</b> из {round(ram.total / 1024**3, 1)} GB\n"
         f"💽 Диск: <b>{disk.percent}%</b> из {round(disk.total / 1024**3, 1)} GB"
     )
@@ -45,20 +69,10 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(text, parse_mode="HTML")
 
     # CPU график
-    plt.figure(figsize=(9, 4))
-    plt.bar(range(len(cpu_cores)), cpu_cores)
-    plt.title("Загрузка CPU по ядрам")
-    plt.xlabel("Ядро")
-    plt.ylabel("Загрузка (%)")
-    plt.tight_layout()
-
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format="png")
-    buffer.seek(0)
-    buffer.name = "cpu_status.png"
-    plt.close()
+    photo = await render_cpu_chart("cpu_status", cpu_cores, (9, 4), "cpu_status.png")
 
-    await update.message.reply_photo(photo=buffer, caption="📊 График загрузки CPU по ядрам")
+    sent = await update.message.reply_photo(photo=photo, caption="📊 График загрузки CPU по ядрам")
+    remember_file_id("cpu_status", sent)
 
 
 async def debugall_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -67,40 +81,29 @@ async def debugall_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("🚫 Вы не являетесь Администратором этого Бота 🚫")
         return
 
-    # Системные данные
-    boot_time = datetime.fromtimestamp(psutil.boot_time(), tz=timezone.utc).astimezone(timezone(timedelta(hours=2)))
-    uptime = timedelta(seconds=int(time.time() - psutil.boot_time()))
-    cpu_percent_total = psutil.cpu_percent()
-    cpu_percent_cores = psutil.cpu_percent(percpu=True)
-    ram = psutil.virtual_memory()
-    swap = psutil.swap_memory()
-    disk = psutil.disk_usage('/')
-    net = psutil.net_io_counters()
-    load_avg = psutil.getloadavg() if hasattr(psutil, "getloadavg") else (0, 0, 0)
-
-    # Топ 5 по CPU
-    processes = []
-    for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-        try:
-            processes.append(proc.info)
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            pass
-    top_cpu = sorted(processes, key=lambda x: x['cpu_percent'], reverse=True)[:5]
-    top_mem = sorted(processes, key=lambda x: x['memory_percent'], reverse=True)[:5]
+    # Системные данные — из фонового сборщика (utils/metrics.py)
+    snapshot = get_snapshot()
+    if snapshot is None:
+        await update.message.reply_text(NO_METRICS_TEXT)
+        return
+
+    boot_time = datetime.fromtimestamp(snapshot["boot_time"], tz=timezone.utc).astimezone(timezone(timedelta(hours=2)))
+    uptime = timedelta(seconds=int(time.time() - snapshot["boot_time"]))
+    cpu_percent_total = snapshot["cpu"]
+    cpu_percent_cores = snapshot["cores"]
+    ram = snapshot["ram"]
+    swap = snapshot["swap"]
+    disk = snapshot["disk"]
+    net = snapshot["net"]
+    load_avg = snapshot["load_avg"]
+
+    # Топ 5 по CPU и памяти (обход процессов тоже делает сборщик)
+    processes = get_processes()
+    top_cpu = processes["top_cpu"]
+    top_mem = processes["top_mem"]
 
     # CPU график
-    plt.figure(figsize=(8, 4))
-    plt.bar(range(len(cpu_percent_cores)), cpu_percent_cores)
-    plt.xlabel('Ядро')
-    plt.ylabel('Загрузка (%)')
-    plt.title('Загрузка CPU по ядрам')
-    plt.tight_layout()
-
-    cpu_img = io.BytesIO()
-    plt.savefig(cpu_img, format='png')
-    cpu_img.seek(0)
-    cpu_img.name = "cpu_debug.png"
-    plt.close()
+    cpu_img = await render_cpu_chart("cpu_debug", cpu_percent_cores, (8, 4), "cpu_debug.png")
 
     # Формирование отчета
     used_gb = round(ram.used / 1024**3, 1)
@@ -110,7 +113,7 @@ async def debugall_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"🖥 <b>OS:</b> {platform.system()} ({platform.machine()})\n"
         f"⏱ <b>Аптайм:</b> <code>{uptime}</code>\n"
         f"🚀 <b>Запущен:</b> {boot_time.strftime('%Y-%m-%d %H:%M:%S')} (UTC+2)\n"
-        f"📊 <b>CPU:</b> {cpu_percent_total}% (ядер: {psutil.cpu_count(logical=True)})\n"
+        f"📊 <b>CPU:</b> {cpu_percent_total}% (ядер: {snapshot['cpu_count']})\n"
         f"📈 <b>Load Avg:</b> {load_avg}\n"
         f"💾 <b>RAM:</b> {ram.percent}% из {round(ram.total / 1024**3, 1)} GB\n"
         f"⏳ Используется: {used_gb} GB | Свободно: {free_gb} GB\n"
@@ -126,5 +129,19 @@ async def debugall_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     for proc in top_mem:
         text += f"🟦 {proc['name']} (PID {proc['pid']}): {proc['memory_percent']:.1f}%\n"
 
+    # Время обработки "!"-команд (счётчики диспетчера utils/command_router.py)
+    command_stats = get_command_stats()[:TOP_COMMANDS]
+    if command_stats:
+        text += "\n<b>⌨️ Команды (вызовов | среднее | максимум):</b>\n"
+        for command, count, avg_ms, max_ms in command_stats:
+            text += f"▫️ {command}: {count} | {avg_ms:.0f} мс | {max_ms:.0f} мс\n"
+
+    rejections = get_rejection_stats()[:TOP_COMMANDS]
+    if rejections:
+        text += "\n<b>🚦 Отклонено лимитами:</b>\n"
+        for name, count in rejections:
+            text += f"▫️ {name}: {count}\n"
+
     await update.message.reply_text(text, parse_mode="HTML")
-    await update.message.reply_photo(InputFile(cpu_img), caption="📊 График загрузки CPU по ядрам")
\ No newline at end of file
+    sent = await update.message.reply_photo(cpu_img, caption="📊 График загрузки CPU по ядрам")
+    remember_file_id("cpu_debug", sent)
\ No newline at end of file
@@ -1,8 +1,20 @@
+from utils.config import PROFILE_STARTUP
+from utils.startup_profile import enable_import_profile, profile_handler_registration, log_startup_profile
+
+# ⏱ Замер импортов включается до импорта telegram и хэндлеров
+if PROFILE_STARTUP:
+    enable_import_profile()
+
 import logging
 import sys
+from telegram import Update
 from telegram.ext import Application
-from utils.config import TOKEN
-from utils.setup_jobqueue import setup_jobqueue  # заглушка или реальная инициализация
+from utils.config import TOKEN, MAX_CONCURRENT_UPDATES
+from utils.update_processor import PerChatUpdateProcessor
+from utils.outbound_scheduler import OutboundScheduler
+from utils.setup_jobqueue import setup_jobqueue, flush_persistent_state
+from utils.persistence import run_io
+from utils.storage import open_storage
 from handlers.creator_bot.restart_bot import on_bot_start
 from utils.setup_handlers import setup_all_handlers  # всё подключение хэндлеров здесь
 
@@ -17,16 +29,36 @@ logging.getLogger("telegram.ext").setLevel(logging.INFO)
 logging.getLogger("telegram.bot").setLevel(logging.INFO)
 
 
-# 🚀 post_init: вызывается после запуска — инициализирует очередь и пишет сообщение о перезапуске
+# 🚀 post_init: вызывается после запуска — читает хранилище (вне event loop), инициализирует очередь
+# и пишет сообщение о перезапуске
 async def post_init(app):
+    await run_io(open_storage)
     await setup_jobqueue(app)
     await on_bot_start(app)
 
 
+# 💾 post_shutdown: вызывается при остановке — сбрасывает резидентные данные на диск
+async def post_shutdown(app):
+    flush_persistent_state()
+
+
 def main():
-    app = Application.builder().token(TOKEN).post_init(post_init).build()
+    app = (
+        Application.builder()
+        .token(TOKEN)
+        .concurrent_updates(PerChatUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .rate_limiter(OutboundScheduler())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    if PROFILE_STARTUP:
+        profile_handler_registration(app)
     setup_all_handlers(app)
-    app.run_polling()
+    if PROFILE_STARTUP:
+        log_startup_profile()
+    # ALL_TYPES — чтобы получать chat_member (обновления статусов участников для кэша)
+    app.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == '__main__':
@@ -41,7 +73,11 @@ if __name__ == '__main__':
 - Настройку логирования
 - Запуск всех хэндлеров (команд, callback-кнопок, сообщений и т.д.)
 - Обработку событий при старте (например, сообщение после перезапуска)
-- Подключение JobQueue (если понадобится в будущем для фоновых задач)
+- Параллельную обработку апдейтов разных чатов (порядок внутри одного чата сохраняется)
+- Темп исходящих запросов к Bot API (очередь с приоритетами и повтором после RetryAfter)
+- Подключение JobQueue (фоновые задачи: отложенная запись данных на диск)
+- Сброс резидентных данных на диск при остановке (`post_shutdown`)
+- Профиль запуска (`PROFILE_STARTUP=1`): время импорта модулей и регистрации хэндлеров
 
 🧩 Основные этапы запуска:
 --------------------------
@@ -49,15 +85,23 @@ if __name__ == '__main__':
 2. 🧱 Создаётся Telegram-приложение с помощью:
        `Application.builder().token(TOKEN).post_init(post_init).build()`
    - `post_init` — функция, вызываемая сразу после старта (подключает `JobQueue` и `on_bot_start`).
+   - `post_shutdown` — функция, вызываемая при остановке (записывает несохранённые данные).
 3. 🔌 В `setup_handlers.py` происходит регистрация всех хэндлеров (по группам, ролям, ЛС и т.д.)
+   - `concurrent_updates(PerChatUpdateProcessor(...))` — чаты обрабатываются параллельно,
+     лимит задаётся переменной окружения `MAX_CONCURRENT_UPDATES` (см. `utils/config.py`).
+   - `rate_limiter(OutboundScheduler())` — все вызовы `context.bot.*` идут через очередь
+     `utils/outbound_scheduler.py`: темп по чатам и общий, модерация раньше игр.
 4. 📬 Включается режим `run_polling()` — бот начинает слушать сообщения.
 
 📂 Модули, участвующие в запуске:
 ---------------------------------
 - `main.py`                — основной файл, точка входа.
-- `utils/config.py`        — загрузка токена и логирования.
+- `utils/config.py`        — загрузка токена, логирования, лимита параллельной обработки и флага профиля.
+- `utils/startup_profile.py` — профиль запуска (включается `PROFILE_STARTUP=1`).
+- `utils/update_processor.py` — параллельная обработка апдейтов с порядком внутри чата.
+- `utils/outbound_scheduler.py` — очередь исходящих запросов (темп, приоритеты, RetryAfter).
 - `setup_handlers.py`      — регистрирует все команды, callback'и и ConversationHandler.
-- `setup_jobqueue.py`      — заглушка для JobQueue (можно использовать позже для автоочистки, напоминаний).
+- `setup_jobqueue.py`      — фоновые задачи JobQueue и сброс резидентных данных на диск.
 - `handlers/...`           — директория со всеми обработчиками (команды, callback, утилиты, игры, роли).
 - `creator_bot/restart_bot.py` — поддержка команды `!restart` и вывод инфо после перезапуска.
 """
\ No newline at end of file
@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from telegram import Chat, Message, Update, User
+
+from handlers import group_stats_updater as stats
+
+
+CHAT = Chat(-100123, Chat.SUPERGROUP)
+USER = User(42, "Tester", False, username="tester")
+
+
+@pytest.fixture(autouse=True)
+def resident_stats(monkeypatch):
+    # Статистика только в памяти — без чтения и записи database/group_stats.json
+    monkeypatch.setattr(stats, "_stats", {})
+    monkeypatch.setattr(stats, "_dirty_chats", set())
+
+
+def _message(message_id, text):
+    return Message(message_id, datetime.now(timezone.utc), CHAT, from_user=USER, text=text)
+
+
+def _dispatch(update):
+    handler = stats.group_stats_handler_obj
+    check = handler.check_update(update)
+    if check is None or check is False:
+        return
+    asyncio.run(handler.handle_update(update, None, check, None))
+
+
+def _counts():
+    return (
+        stats.get_3day_message_count(CHAT.id),
+        stats.get_3day_active_users(CHAT.id),
+        stats.get_top10_users(CHAT.id),
+    )
+
+
+def test_new_message_is_counted():
+    _dispatch(Update(1, message=_message(1, "привет")))
+
+    assert _counts() == (1, 1, [(1, "tester", 1)])
+
+
+def test_edited_message_is_not_counted():
+    _dispatch(Update(1, message=_message(1, "привет")))
+    before = _counts()
+
+    _dispatch(Update(2, edited_message=_message(1, "привет!")))
+    # Проверка и в самом хэндлере — на случай регистрации с другим фильтром
+    asyncio.run(stats.group_stats_handler(Update(3, edited_message=_message(1, "привет!!")), None))
+
+    assert _counts() == before
@@ -0,0 +1,78 @@
+from utils.storage import get_store
+
+ADMIN_DB = "database/admin_db.json"
+
+# Уровни доступа администраторов бота
+LEVEL_DEPUTY = "Заместитель Главы"
+LEVEL_SENIOR = "Соруководитель"
+
+# 🧠 Резидентный реестр: chat_id -> {"group_title": ..., "admins": {user_id: {...}}}
+# Хранилище читается один раз, дальше все проверки ролей — обращение к dict в памяти
+_admins = None
+
+
+# Хранилище реестра (utils/storage.py): одна запись на группу
+def _get_store():
+    return get_store("admins", ADMIN_DB)
+
+
+def _get_registry():
+    global _admins
+    if _admins is None:
+        _admins = _get_store().load()
+    return _admins
+
+
+# Администраторы группы: user_id -> {"username", "level"} (None — группы нет в базе)
+def get_group_admins(chat_id):
+    group = _get_registry().get(str(chat_id))
+    if group is None:
+        return None
+    return group.get("admins", {})
+
+
+# Название группы, сохранённое при назначении первого администратора
+def get_group_title(chat_id):
+    return _get_registry().get(str(chat_id), {}).get("group_title", "Без названия")
+
+
+# Уровень администратора ("" — если пользователь не администратор)
+def get_admin_level(chat_id, user_id) -> str:
+    admins = get_group_admins(chat_id) or {}
+    return admins.get(str(user_id), {}).get("level", "")
+
+
+# Может ли пользователь управлять администраторами (только Заместитель Главы)
+def has_admin_permission(user_id, chat_id) -> bool:
+    return get_admin_level(chat_id, user_id) == LEVEL_DEPUTY
+
+
+# Назначаем/обновляем администратора. Возвращает True, если он уже был администратором
+def set_admin(chat_id, chat_title: str, user_id, username, level: str) -> bool:
+    registry = _get_registry()
+    chat_id = str(chat_id)
+    user_id = str(user_id)
+
+    if chat_id not in registry:
+        registry[chat_id] = {
+            "group_title": chat_title,
+            "admins": {}
+        }
+
+    already_admin = user_id in registry[chat_id]["admins"]
+    registry[chat_id]["admins"][user_id] = {
+        "username": username if username else None,
+        "level": level
+    }
+    _get_store().put(chat_id, registry[chat_id])
+    return already_admin
+
+
+# Снимаем администратора. Возвращает его запись или None, если он не был администратором
+def remove_admin(chat_id, user_id):
+    admins = get_group_admins(chat_id)
+    if not admins or str(user_id) not in admins:
+        return None
+    removed = admins.pop(str(user_id))
+    _get_store().put(str(chat_id), _get_registry()[str(chat_id)])
+    return removed
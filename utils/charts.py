@@ -0,0 +1,95 @@
+"""
+Сервис отрисовки графиков для !status и !debug-all.
+
+- Рисование идёт через объектный API matplotlib (Figure + FigureCanvasAgg), без глобального
+  состояния pyplot, в отдельном пуле из одного потока — event loop не блокируется.
+- Шаблоны фигур переиспользуются: для каждого графика фигура и оси создаются один раз,
+  дальше меняются только высоты столбцов.
+- Готовый PNG кэшируется на CHART_CACHE_TTL секунд: повторный вызов в это время не рисует
+  заново, а после первой отправки — отдаёт Telegram file_id вместо повторной загрузки файла.
+- matplotlib импортируется лениво — в потоке отрисовки при первом графике, а не при запуске бота.
+"""
+
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Сколько секунд один и тот же PNG считается актуальным
+CHART_CACHE_TTL = 10
+
+# Один поток: шаблоны фигур используются без блокировок
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="charts")
+
+# Шаблоны: ключ графика -> {"figure", "canvas", "axes", "bars"}
+_templates = {}
+
+# Кэш готовых графиков: ключ -> {"expires", "png", "file_id"}
+_rendered = {}
+
+
+def _get_template(key, figsize, title, xlabel, ylabel):
+    template = _templates.get(key)
+    if template is None:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        figure = Figure(figsize=figsize)
+        canvas = FigureCanvasAgg(figure)
+        axes = figure.add_subplot()
+        axes.set_title(title)
+        axes.set_xlabel(xlabel)
+        axes.set_ylabel(ylabel)
+        template = _templates[key] = {"figure": figure, "canvas": canvas, "axes": axes, "bars": None}
+    return template
+
+
+def _render_bar_chart(key, values, figsize, title, xlabel, ylabel):
+    template = _get_template(key, figsize, title, xlabel, ylabel)
+    bars = template["bars"]
+
+    if bars is not None and len(bars) == len(values):
+        # Тот же набор столбцов — меняем только высоты
+        for bar, value in zip(bars, values):
+            bar.set_height(value)
+    else:
+        if bars is not None:
+            bars.remove()
+        template["bars"] = template["axes"].bar(range(len(values)), values)
+
+    axes = template["axes"]
+    axes.relim()
+    axes.autoscale_view()
+    template["figure"].tight_layout()
+
+    buffer = io.BytesIO()
+    template["canvas"].print_png(buffer)
+    return buffer.getvalue()
+
+
+async def render_bar_chart(key, values, figsize=(9, 4), title="", xlabel="", ylabel="", filename="chart.png"):
+    """
+    Возвращает то, что можно передать в reply_photo:
+    file_id (если этот PNG уже отправлялся) или BytesIO с картинкой.
+    """
+    now = time.monotonic()
+    cached = _rendered.get(key)
+    if cached is None or cached["expires"] <= now:
+        png = await asyncio.get_running_loop().run_in_executor(
+            _executor, _render_bar_chart, key, list(values), figsize, title, xlabel, ylabel
+        )
+        cached = _rendered[key] = {"expires": now + CHART_CACHE_TTL, "png": png, "file_id": None}
+
+    if cached["file_id"]:
+        return cached["file_id"]
+
+    buffer = io.BytesIO(cached["png"])
+    buffer.name = filename
+    return buffer
+
+
+# Запоминаем file_id после отправки — следующие отправки в пределах TTL пойдут без загрузки
+def remember_file_id(key, sent_message):
+    cached = _rendered.get(key)
+    if cached and not cached["file_id"] and sent_message and sent_message.photo:
+        cached["file_id"] = sent_message.photo[-1].file_id
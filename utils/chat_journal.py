@@ -0,0 +1,387 @@
+"""
+Журнал личных сообщений (append-only).
+
+Каждая запись — одна JSON-строка в файле-сегменте `database/chat_history.NNNNNN.jsonl`.
+Новая запись всегда дописывается в конец последнего (активного) сегмента, поэтому
+стоимость записи не зависит от размера всей истории. Дописывание идёт пачками
+в потоке записи (utils/persistence.py); хэндлер читает через read_journal() —
+после дописывания накопленного, в потоке записи.
+
+- Когда активный сегмент превышает SEGMENT_MAX_BYTES — открывается следующий (ротация).
+- compact_journal() сливает подряд идущие небольшие закрытые сегменты (в потоке записи)
+  и выбрасывает повреждённые строки; уже крупные сегменты не переписываются.
+- Старый файл chat_history.json переносится в журнал автоматически при первом обращении.
+
+Индекс (строится одним проходом при открытии и дальше поддерживается при каждой записи):
+- user_id -> список позиций (сегмент, смещение) его записей — для /export_chat;
+- таблица уникальных пользователей (user_id -> имя из первой записи) — для /export_users.
+
+При STORAGE_BACKEND=sqlite журнал хранится в таблице chat_history (utils/storage.py),
+а файловые сегменты только однократно переносятся туда.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+from functools import partial
+from utils.persistence import atomic_write_bytes, drain_writes, run_io, schedule_write
+from utils.storage import get_sqlite_journal
+
+DATABASE_PATH = "database"
+LEGACY_CHAT_HISTORY_FILE = "database/chat_history.json"
+
+SEGMENT_PREFIX = "chat_history."
+SEGMENT_SUFFIX = ".jsonl"
+
+# Максимальный размер активного сегмента (в байтах) до ротации
+SEGMENT_MAX_BYTES = 512 * 1024
+
+# Сжимать журнал, когда небольших закрытых сегментов накопилось столько или больше
+COMPACT_MIN_SEGMENTS = 8
+
+# Предельный размер слитого сегмента (в байтах); сегменты такого размера больше не сжимаются
+COMPACT_TARGET_BYTES = 8 * SEGMENT_MAX_BYTES
+
+# Как часто (в секундах) JobQueue проверяет, пора ли сжимать журнал
+COMPACT_INTERVAL = 6 * 60 * 60
+
+# Незавершённое сжатие: {"target": номер, "sources": [номера]} — см. compact_journal()
+COMPACT_MANIFEST = "database/chat_history.compact.json"
+
+_SEGMENT_RE = re.compile(rf"^{re.escape(SEGMENT_PREFIX)}(\d{{6}}){re.escape(SEGMENT_SUFFIX)}$")
+
+# Номер и размер активного сегмента (None — журнал ещё не открыт)
+_active_number = None
+_active_size = 0
+
+# 🗂 Индекс: user_id -> [(номер сегмента, смещение строки), ...]
+_user_offsets = {}
+
+# 👥 Уникальные пользователи в порядке первого появления: user_id -> sender_name
+_distinct_users = {}
+
+# ✍️ Строки, ещё не дописанные на диск: номер сегмента -> [bytes, ...]
+# (пишутся пачкой в потоке записи utils/persistence.py; смещения в индексе известны заранее)
+_pending_lines = {}
+
+# 🔒 Сжатие и чтение из хэндлеров не идут одновременно (read_journal)
+_compaction_lock = asyncio.Lock()
+
+
+def _segment_path(number: int) -> str:
+    return os.path.join(DATABASE_PATH, f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}")
+
+
+# Номера всех сегментов по возрастанию
+def list_segments():
+    if not os.path.isdir(DATABASE_PATH):
+        return []
+    numbers = []
+    for filename in os.listdir(DATABASE_PATH):
+        match = _SEGMENT_RE.match(filename)
+        if match:
+            numbers.append(int(match.group(1)))
+    return sorted(numbers)
+
+
+# Перенос старого chat_history.json (один большой список) в журнал
+def _migrate_legacy_history():
+    if not os.path.exists(LEGACY_CHAT_HISTORY_FILE):
+        return
+    try:
+        with open(LEGACY_CHAT_HISTORY_FILE, "r", encoding="utf-8") as f:
+            logs = json.load(f)
+    except Exception as e:
+        logging.error(f"Не удалось прочитать {LEGACY_CHAT_HISTORY_FILE} для переноса: {e}")
+        return
+
+    # Сегмент появляется целиком (временный файл + rename) — сбой не оставит обрезанную историю
+    data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in logs)
+    atomic_write_bytes(_segment_path(1), data.encode("utf-8"))
+    os.replace(LEGACY_CHAT_HISTORY_FILE, LEGACY_CHAT_HISTORY_FILE + ".bak")
+    logging.info(f"[JOURNAL] Перенесено {len(logs)} записей из {LEGACY_CHAT_HISTORY_FILE}")
+
+
+# Добавляем запись в индекс
+def _index_entry(entry: dict, number: int, offset: int):
+    uid = entry.get("user_id")
+    _user_offsets.setdefault(uid, []).append((number, offset))
+    if uid not in _distinct_users:
+        _distinct_users[uid] = entry.get("sender_name")
+
+
+# Полная перестройка индекса (при открытии журнала)
+def _rebuild_index():
+    _user_offsets.clear()
+    _distinct_users.clear()
+    for number in list_segments():
+        with open(_segment_path(number), "rb") as f:
+            offset = 0
+            for line in f:
+                try:
+                    _index_entry(json.loads(line), number, offset)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    pass
+                offset += len(line)
+
+
+# Открываем журнал: находим активный сегмент (и переносим старую историю, если есть)
+def _open_journal():
+    global _active_number, _active_size
+    if _active_number is not None:
+        return
+
+    os.makedirs(DATABASE_PATH, exist_ok=True)
+    _finish_compaction()
+    segments = list_segments()
+    if not segments:
+        _migrate_legacy_history()
+        segments = list_segments()
+
+    _active_number = segments[-1] if segments else 1
+    path = _segment_path(_active_number)
+    _active_size = os.path.getsize(path) if os.path.exists(path) else 0
+
+    # Если последняя строка оборвана (сбой посреди записи) — пишем дальше в новый сегмент,
+    # чтобы новая запись не склеилась с повреждённой
+    if _active_size:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                _active_number += 1
+                _active_size = 0
+
+    _rebuild_index()
+
+
+# Дописываем одну запись в конец активного сегмента
+def append_entry(entry: dict):
+    global _active_number, _active_size
+    journal = get_sqlite_journal()
+    if journal:
+        journal.append(entry)
+        return
+
+    _open_journal()
+
+    if _active_size >= SEGMENT_MAX_BYTES:
+        _active_number += 1
+        _active_size = 0
+
+    line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+    _pending_lines.setdefault(_active_number, []).append(line)
+    schedule_write(_segment_path(_active_number), partial(_prepare_append, _active_number))
+    _index_entry(entry, _active_number, _active_size)
+    _active_size += len(line)
+
+
+# Забираем накопленные строки сегмента в поток записи (новые строки копятся в новом списке)
+def _prepare_append(number: int):
+    lines = _pending_lines.pop(number, [])
+    data = b"".join(lines)
+
+    def write():
+        with open(_segment_path(number), "ab") as f:
+            f.write(data)
+
+    def failed():
+        # Строки возвращаются в начало очереди сегмента — порядок и смещения индекса сохраняются
+        _pending_lines.setdefault(number, [])[:0] = lines
+
+    return write, None, failed
+
+
+# Читаем один сегмент построчно; оборванные/повреждённые строки пропускаем
+def _iter_segment(number: int):
+    try:
+        with open(_segment_path(number), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+# Потоковое чтение файлового журнала (используется и для переноса в SQLite)
+def iter_file_entries():
+    _open_journal()
+    for number in list_segments():
+        yield from _iter_segment(number)
+
+
+# Чтение всего журнала в хронологическом порядке
+def iter_entries():
+    journal = get_sqlite_journal()
+    if journal:
+        return journal.iter_entries()
+    return iter_file_entries()
+
+
+# Записи одного пользователя — читаются точечно по смещениям из индекса
+def iter_user_entries(user_id):
+    journal = get_sqlite_journal()
+    if journal:
+        return journal.iter_user_entries(user_id)
+    return _iter_file_user_entries(user_id)
+
+
+def _iter_file_user_entries(user_id):
+    _open_journal()
+    # Копия: чтение может идти в потоке записи, пока event loop дописывает индекс
+    positions = list(_user_offsets.get(str(user_id), ()))
+    f = None
+    current = None
+    try:
+        for number, offset in positions:
+            if number != current:
+                if f:
+                    f.close()
+                f = open(_segment_path(number), "rb")
+                current = number
+            f.seek(offset)
+            try:
+                yield json.loads(f.readline())
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+    finally:
+        if f:
+            f.close()
+
+
+# Таблица уникальных пользователей: user_id -> имя отправителя из первой записи
+def get_distinct_users():
+    journal = get_sqlite_journal()
+    if journal:
+        return journal.distinct_users()
+    _open_journal()
+    return dict(_distinct_users)
+
+
+# Сжатие (в потоке записи): подряд идущие небольшие закрытые сегменты сливаются в один —
+# не больше COMPACT_TARGET_BYTES. Крупные (уже сжатые) сегменты не переписываются, поэтому
+# стоимость сжатия не растёт вместе с историей. Возвращает [(target, sources, позиции)]
+# для _apply_compaction — индекс меняется уже в event loop
+def compact_journal(active_number: int, min_segments: int = COMPACT_MIN_SEGMENTS):
+    _finish_compaction()  # Доводим прерванное ошибкой прошлое сжатие
+    groups = _plan_compaction(active_number)
+    if sum(len(group) for group in groups) < max(min_segments, 2):
+        return []
+
+    results = []
+    for group in groups:
+        try:
+            results.append((group[0], group[1:], _merge_segments(group)))
+        except OSError as e:
+            # Уже слитые группы возвращаются — их позиции нужны индексу
+            logging.error(f"Ошибка сжатия журнала сообщений: {type(e).__name__} - {e}")
+            break
+    return results
+
+
+# Группы подряд идущих небольших закрытых сегментов (только группы из 2+ сегментов)
+def _plan_compaction(active_number: int):
+    groups = []
+    group = []
+    group_size = 0
+    for number in list_segments():
+        if number >= active_number:
+            break
+        size = os.path.getsize(_segment_path(number))
+        if group and group_size + size > COMPACT_TARGET_BYTES:
+            groups.append(group)
+            group, group_size = [], 0
+        if size >= COMPACT_TARGET_BYTES:
+            continue  # Крупный сегмент разрывает группу: порядок записей сохраняется
+        group.append(number)
+        group_size += size
+    groups.append(group)
+    return [group for group in groups if len(group) >= 2]
+
+
+# Сливаем сегменты группы в первый из них; возвращает позиции записей в слитом сегменте:
+# user_id -> [(номер, смещение), ...]
+def _merge_segments(group: list) -> dict:
+    target, sources = group[0], group[1:]
+    compact_path = _segment_path(target) + ".compact"
+    positions = {}
+
+    # 1. Слитый сегмент пишется потоком рядом с исходными и появляется целиком (fsync + rename)
+    tmp_path = compact_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        offset = 0
+        for number in group:
+            for entry in _iter_segment(number):
+                line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+                f.write(line)
+                positions.setdefault(entry.get("user_id"), []).append((target, offset))
+                offset += len(line)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, compact_path)
+    # 2. Манифест: после него сжатие доводится до конца и после сбоя (_finish_compaction)
+    atomic_write_bytes(COMPACT_MANIFEST, json.dumps({"target": target, "sources": sources}).encode("utf-8"))
+    # 3. Слитый сегмент встаёт на место первого, 4. исходные удаляются только после этого
+    os.replace(compact_path, _segment_path(target))
+    try:
+        _finish_compaction()
+    except OSError as e:
+        # Слитый сегмент уже на месте — исходные удалит следующее сжатие или открытие журнала
+        logging.error(f"Не удалось удалить сжатые сегменты журнала: {type(e).__name__} - {e}")
+    return positions
+
+
+# Подставляем в индекс позиции слитых сегментов (в event loop — не пересекается с append_entry).
+# Сегменты группы идут подряд, поэтому позиции до и после неё остаются на своих местах
+def _apply_compaction(results):
+    for target, sources, positions in results:
+        last = sources[-1]
+        for uid, merged in positions.items():
+            old = _user_offsets.get(uid, [])
+            _user_offsets[uid] = (
+                [p for p in old if p[0] < target] + merged + [p for p in old if p[0] > last]
+            )
+        logging.info(f"[JOURNAL] Сжато сегментов: {len(sources) + 1} -> 1")
+
+
+# Доводим сжатие до конца (в т.ч. прерванное сбоем): если слитый сегмент уже на месте —
+# удаляем оставшиеся исходные, иначе отменяем сжатие (исходные сегменты не тронуты)
+def _finish_compaction():
+    if not os.path.exists(COMPACT_MANIFEST):
+        return
+    with open(COMPACT_MANIFEST, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    compact_path = _segment_path(manifest["target"]) + ".compact"
+    if os.path.exists(compact_path):
+        os.remove(compact_path)
+    else:
+        for number in manifest["sources"]:
+            if os.path.exists(_segment_path(number)):
+                os.remove(_segment_path(number))
+    os.remove(COMPACT_MANIFEST)
+
+
+# Чтение файлового журнала из хэндлера: после дописывания очереди, в потоке записи
+# и не во время сжатия (пока индекс не обновлён, его смещения не совпадают с файлами)
+async def read_journal(fn, *args):
+    async with _compaction_lock:
+        await drain_writes()
+        return await run_io(fn, *args)
+
+
+# Задача для JobQueue — периодическое сжатие журнала (файлы — в потоке записи, индекс — здесь)
+async def compact_journal_job(context):
+    if get_sqlite_journal():
+        return  # В SQLite сжимать нечего
+    async with _compaction_lock:
+        await drain_writes()
+        _open_journal()
+        try:
+            results = await run_io(compact_journal, _active_number)
+        except OSError as e:
+            logging.error(f"Ошибка сжатия журнала сообщений: {type(e).__name__} - {e}")
+            return
+        _apply_compaction(results)
@@ -0,0 +1,77 @@
+import time
+from telegram import Update
+from telegram.ext import BaseHandler
+from utils.message_traits import get_traits
+
+# Счётчики по командам: команда -> [кол-во вызовов, суммарное время, максимальное время]
+_command_stats = {}
+
+
+class CommandRouter(BaseHandler):
+    """
+    Единый диспетчер "!"-команд (вместо цепочки MessageHandler с regex).
+
+    Первое слово сообщения выделяется один раз (utils/message_traits.py) и ищется в словаре
+    маршрутов — точное совпадение: "!shoot" и "!shootme" не пересекаются, порядок регистрации
+    не важен.
+    Если команда не найдена, апдейт идёт дальше по хэндлерам той же группы.
+
+    Маршрут с needs_args=True срабатывает только при наличии аргументов — так
+    "!export_db all" обрабатывается сразу, а просто "!export_db" уходит в ConversationHandler.
+    Маршрут с no_args=True — только команда целиком, без аргументов ("!restart", но не "!restart x").
+    """
+    __slots__ = ("_routes",)
+
+    def __init__(self, routes=None):
+        # Колбэк выбирается маршрутом в check_update
+        super().__init__(callback=None)
+        # команда -> (колбэк, нужны ли аргументы, запрещены ли аргументы)
+        self._routes = {}
+        for command, callback in (routes or {}).items():
+            self.add(command, callback)
+
+    def add(self, command: str, callback, needs_args: bool = False, no_args: bool = False):
+        self._routes[command] = (callback, needs_args, no_args)
+
+    def check_update(self, update):
+        if not isinstance(update, Update) or not update.message:
+            return None
+        traits = get_traits(update)
+        if not traits.is_bang_command:
+            return None
+
+        route = self._routes.get(traits.command)
+        if route is None:
+            return None
+
+        callback, needs_args, no_args = route
+        if needs_args and not traits.has_args:
+            return None
+        if no_args and traits.has_args:
+            return None
+        return traits.command, callback
+
+    async def handle_update(self, update, application, check_result, context):
+        command, callback = check_result
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = _command_stats.get(command)
+            if stats is None:
+                stats = _command_stats[command] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += elapsed
+            if elapsed > stats[2]:
+                stats[2] = elapsed
+
+
+# Статистика команд: [(команда, вызовов, среднее_мс, максимум_мс)] — по убыванию суммарного времени
+def get_command_stats():
+    return [
+        (command, count, total / count * 1000, worst * 1000)
+        for command, (count, total, worst) in sorted(
+            _command_stats.items(), key=lambda item: item[1][1], reverse=True
+        )
+    ]
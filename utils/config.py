@@ -8,6 +8,16 @@ load_dotenv(dotenv_path='utils/token.env')
 # Получаем токен из окружения
 TOKEN = os.getenv('TOKEN')
 
+# Сколько апдейтов обрабатывается одновременно (разные чаты — параллельно, один чат — по порядку)
+# 1 — полностью последовательная обработка, как раньше
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', '16'))
+
+# Движок хранилища данных: json (файлы database/*.json) или sqlite (database/bot.sqlite3, см. utils/storage.py)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json')
+
+# PROFILE_STARTUP=1 — вывести в лог профиль запуска (время импорта модулей и регистрации хэндлеров)
+PROFILE_STARTUP = os.getenv('PROFILE_STARTUP', '') == '1'
+
 # Настройка логирования
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -0,0 +1,82 @@
+import logging
+import time
+from telegram import Update
+from telegram.ext import ContextTypes
+
+# Сколько секунд считаем ответ Telegram актуальным
+MEMBER_TTL = 60
+MEMBER_COUNT_TTL = 120
+
+# Ограничение размера кэша (при превышении выбрасываются самые старые записи)
+MAX_CACHED_MEMBERS = 5000
+
+# 🧠 (chat_id, user_id) -> (истекает_в, ChatMember)
+# Порядок вставки = порядок истечения (TTL одинаковый, обновлённая запись переставляется в конец),
+# поэтому устаревшие записи всегда в начале словаря
+_members = {}
+
+# 🧠 chat_id -> (истекает_в, количество участников)
+_member_counts = {}
+
+
+def _store(cache: dict, key, expires: float, value):
+    cache.pop(key, None)
+    cache[key] = (expires, value)
+
+
+# Выбрасываем записи из начала словаря: истёкшие и сверх лимита — O(1) на вставку в среднем
+def _trim(cache: dict, now: float):
+    while cache:
+        key = next(iter(cache))
+        if cache[key][0] > now and len(cache) <= MAX_CACHED_MEMBERS:
+            break
+        del cache[key]
+
+
+# Статус участника чата (get_chat_member) с кэшем на MEMBER_TTL секунд
+async def get_chat_member_cached(bot, chat_id, user_id):
+    key = (int(chat_id), int(user_id))
+    now = time.monotonic()
+    cached = _members.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    member = await bot.get_chat_member(key[0], key[1])
+    _store(_members, key, now + MEMBER_TTL, member)
+    _trim(_members, now)
+    return member
+
+
+# Количество участников чата (get_chat_member_count) с кэшем на MEMBER_COUNT_TTL секунд
+async def get_member_count_cached(bot, chat_id):
+    chat_id = int(chat_id)
+    now = time.monotonic()
+    cached = _member_counts.get(chat_id)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    count = await bot.get_chat_member_count(chat_id)
+    _store(_member_counts, chat_id, now + MEMBER_COUNT_TTL, count)
+    _trim(_member_counts, now)
+    return count
+
+
+# Сбросить кэш участника — после действий бота, меняющих его статус (бан, повышение и т.д.)
+def invalidate_member(chat_id, user_id):
+    _members.pop((int(chat_id), int(user_id)), None)
+    _member_counts.pop(int(chat_id), None)
+
+
+# Хэндлер ChatMemberUpdated: Telegram сам присылает новый статус — кладём его в кэш
+async def track_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    member_update = update.chat_member or update.my_chat_member
+    if not member_update:
+        return
+
+    chat_id = member_update.chat.id
+    new_member = member_update.new_chat_member
+    now = time.monotonic()
+    _store(_members, (chat_id, new_member.user.id), now + MEMBER_TTL, new_member)
+    _member_counts.pop(chat_id, None)
+    _trim(_members, now)
+    logging.debug(f"[MEMBERS] {chat_id}: {new_member.user.id} -> {new_member.status}")
@@ -0,0 +1,100 @@
+"""
+Предварительная классификация сообщений: признаки считаются один раз на апдейт.
+
+Вместо того чтобы каждый хэндлер заново проверял тип чата, регулярку "^!", команды и медиа,
+признаки сообщения вычисляются при первом обращении и кэшируются по update_id.
+Фильтры ниже (BANG_COMMAND, PLAIN_TEXT, GROUP_PLAIN_TEXT, PRIVATE_TEXT) читают готовые
+признаки — обычная переписка в группе отсеивается ими за одно обращение к словарю.
+"""
+
+from telegram import MessageEntity, Update
+from telegram.constants import ChatType
+from telegram.ext import filters
+
+# Сколько апдейтов помнить (одновременно обрабатывается не больше MAX_CONCURRENT_UPDATES)
+TRAITS_CACHE_SIZE = 256
+
+GROUP_CHAT_TYPES = (ChatType.GROUP, ChatType.SUPERGROUP)
+
+# Тип медиа — первый найденный атрибут сообщения из этого списка
+MEDIA_KINDS = ("photo", "video", "animation", "document", "audio", "voice", "video_note", "sticker")
+
+# update_id -> MessageTraits (None — в апдейте нет сообщения)
+_traits_cache = {}
+
+
+class MessageTraits:
+    __slots__ = ("chat_type", "is_group", "is_private", "has_text", "is_bang_command",
+                 "command", "has_args", "is_bot_command", "is_reply", "media")
+
+    def __init__(self, message):
+        text = message.text
+        self.chat_type = message.chat.type
+        self.is_group = self.chat_type in GROUP_CHAT_TYPES
+        self.is_private = self.chat_type == ChatType.PRIVATE
+        self.has_text = bool(text)
+        self.is_bang_command = self.has_text and text.startswith("!")
+
+        # Первое слово "!"-команды и есть ли после него аргументы
+        self.command = None
+        self.has_args = False
+        if self.is_bang_command:
+            parts = text.split(maxsplit=1)
+            self.command = parts[0]
+            self.has_args = len(parts) > 1
+
+        # "/команда" в начале — как filters.COMMAND
+        entities = message.entities
+        self.is_bot_command = bool(
+            entities and entities[0].type == MessageEntity.BOT_COMMAND and entities[0].offset == 0
+        )
+
+        self.is_reply = message.reply_to_message is not None
+        self.media = next((kind for kind in MEDIA_KINDS if getattr(message, kind)), None)
+
+
+# Признаки сообщения апдейта (effective_message — как у стандартных фильтров)
+def get_traits(update):
+    if not isinstance(update, Update):
+        return None
+    update_id = update.update_id
+    if update_id in _traits_cache:
+        return _traits_cache[update_id]
+
+    message = update.effective_message
+    traits = MessageTraits(message) if message else None
+
+    if len(_traits_cache) >= TRAITS_CACHE_SIZE:
+        # Словарь хранит порядок вставки — вытесняем самый старый апдейт
+        del _traits_cache[next(iter(_traits_cache))]
+    _traits_cache[update_id] = traits
+    return traits
+
+
+class _TraitsFilter(filters.UpdateFilter):
+    __slots__ = ("_predicate",)
+
+    def __init__(self, predicate, name):
+        super().__init__(name=name)
+        self._predicate = predicate
+
+    def filter(self, update):
+        traits = get_traits(update)
+        return traits is not None and self._predicate(traits)
+
+
+# Текст начинается с "!"
+BANG_COMMAND = _TraitsFilter(lambda t: t.is_bang_command, "BANG_COMMAND")
+
+# Текст без "!"-команды (любой чат)
+PLAIN_TEXT = _TraitsFilter(lambda t: t.has_text and not t.is_bang_command, "PLAIN_TEXT")
+
+# Текст без "!"-команды в группе
+GROUP_PLAIN_TEXT = _TraitsFilter(
+    lambda t: t.is_group and t.has_text and not t.is_bang_command, "GROUP_PLAIN_TEXT"
+)
+
+# Текст в ЛС, не "/команда"
+PRIVATE_TEXT = _TraitsFilter(
+    lambda t: t.is_private and t.has_text and not t.is_bot_command, "PRIVATE_TEXT"
+)
@@ -0,0 +1,118 @@
+"""
+Фоновый сборщик системных метрик для !status и !debug-all.
+
+JobQueue периодически снимает показатели в пуле потоков (не блокируя event loop):
+- каждые SAMPLE_INTERVAL секунд — CPU (общий и по ядрам), RAM, SWAP, диск, сеть;
+- каждые PROCESS_SAMPLE_INTERVAL секунд — топ процессов по CPU и памяти.
+
+Команды только читают готовый снимок — ответ приходит мгновенно.
+psutil импортируется лениво — уже в пуле потоков, при первом замере, а не при запуске бота.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+# Как часто (в секундах) снимаются системные метрики
+SAMPLE_INTERVAL = 2
+
+# Сколько последних замеров CPU храним (скользящее окно)
+WINDOW_SIZE = 30
+
+# Как часто (в секундах) обходится список процессов (это дорого)
+PROCESS_SAMPLE_INTERVAL = 15
+
+# Сколько процессов показывать в топах
+TOP_PROCESSES = 5
+
+# 📈 Скользящее окно замеров CPU: {"time", "cpu", "cores"}
+_cpu_window = deque(maxlen=WINDOW_SIZE)
+
+# 🖥 Последний полный снимок системы
+_snapshot = None
+
+# 🔥 Последний снимок процессов
+_processes = {"time": 0, "top_cpu": [], "top_mem": []}
+
+# Первый вызов psutil.cpu_percent(interval=None) всегда возвращает 0.0 — он только "заводит" счётчик
+_cpu_primed = False
+
+
+def _sample_system():
+    global _cpu_primed
+    import psutil
+    cores = psutil.cpu_percent(interval=None, percpu=True)
+    if not _cpu_primed:
+        _cpu_primed = True
+        return None
+
+    return {
+        "time": time.time(),
+        "cpu": round(sum(cores) / len(cores), 1) if cores else 0.0,
+        "cores": cores,
+        "cpu_count": psutil.cpu_count(logical=True),
+        "boot_time": psutil.boot_time(),
+        "load_avg": psutil.getloadavg() if hasattr(psutil, "getloadavg") else (0, 0, 0),
+        "ram": psutil.virtual_memory(),
+        "swap": psutil.swap_memory(),
+        "disk": psutil.disk_usage('/'),
+        "net": psutil.net_io_counters()
+    }
+
+
+def _sample_processes():
+    import psutil
+    processes = []
+    # process_iter кэширует объекты процессов — cpu_percent считается с прошлого обхода
+    for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
+        try:
+            info = proc.info
+            if info['cpu_percent'] is None or info['memory_percent'] is None:
+                continue
+            processes.append(info)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return {
+        "time": time.time(),
+        "top_cpu": sorted(processes, key=lambda x: x['cpu_percent'], reverse=True)[:TOP_PROCESSES],
+        "top_mem": sorted(processes, key=lambda x: x['memory_percent'], reverse=True)[:TOP_PROCESSES]
+    }
+
+
+# Задача для JobQueue — замер системы (в пуле потоков)
+async def sample_system_job(context):
+    global _snapshot
+    try:
+        sample = await asyncio.get_running_loop().run_in_executor(None, _sample_system)
+    except Exception as e:
+        logging.error(f"[METRICS] Ошибка замера системы: {type(e).__name__} - {e}")
+        return
+    if sample is None:
+        return
+    _snapshot = sample
+    _cpu_window.append({"time": sample["time"], "cpu": sample["cpu"], "cores": sample["cores"]})
+
+
+# Задача для JobQueue — обход процессов (в пуле потоков)
+async def sample_processes_job(context):
+    global _processes
+    try:
+        _processes = await asyncio.get_running_loop().run_in_executor(None, _sample_processes)
+    except Exception as e:
+        logging.error(f"[METRICS] Ошибка обхода процессов: {type(e).__name__} - {e}")
+
+
+# Последний снимок системы (None — если сборщик ещё не успел сделать замер)
+def get_snapshot():
+    return _snapshot
+
+
+# Последний снимок процессов
+def get_processes():
+    return _processes
+
+
+# Скользящее окно замеров CPU (от старых к новым)
+def get_cpu_window():
+    return list(_cpu_window)
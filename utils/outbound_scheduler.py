@@ -0,0 +1,287 @@
+"""
+Планировщик исходящих запросов к Bot API (rate limiter для Application.builder().rate_limiter()).
+
+Все вызовы context.bot.* проходят через process_request — хэндлеры ничего не меняют.
+
+- Темп: общий для бота (GLOBAL_RATE в секунду) и по каждому чату (группы — GROUP_RATE в минуту,
+  ЛС — PRIVATE_RATE в секунду). Кратковременные всплески сглаживаются запасом ведра.
+  Темп чата расходуют только новые сообщения и правки (SEND_PREFIXES); удаления, баны и прочее
+  идут только через общий темп.
+- Приоритеты: очередь разбита на полосы — модерация (бан, мут, удаление) раньше обычных
+  сообщений, игры — последними. Полоса задаётся через rate_limit_args=LANE_GAME у вызова
+  или по методу (LANE_BY_ENDPOINT). Чат, который упёрся в свой темп, не задерживает остальные.
+- RetryAfter: чат ставится на паузу на указанное время, запрос повторяется сам (до MAX_RETRIES раз).
+- Правки одного сообщения (COALESCED_ENDPOINTS), ждущие в очереди, склеиваются — уходит
+  только последняя, остальные вызовы получают её результат. Правка, получившая RetryAfter,
+  не повторяется, если за это время пришла более новая.
+- getUpdates, get*-запросы, answerCallbackQuery и запросы без chat_id не задерживаются.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+# Общий темп бота: запросов в секунду
+GLOBAL_RATE = 30
+
+# Группы: сообщений в минуту (лимит Telegram — 20), запас для всплеска
+GROUP_RATE = 20
+GROUP_BURST = 20
+
+# ЛС: сообщений в секунду, запас для всплеска
+PRIVATE_RATE = 1
+PRIVATE_BURST = 3
+
+# Сколько раз повторять запрос после RetryAfter
+MAX_RETRIES = 3
+
+# Как часто (в секундах) удаляются данные о неактивных чатах
+SWEEP_INTERVAL = 60
+
+# Полосы очереди (в порядке приоритета). Значения — строки: PTB не передаёт "пустые" rate_limit_args
+LANE_MODERATION = "moderation"
+LANE_DEFAULT = "default"
+LANE_GAME = "game"
+LANES = (LANE_MODERATION, LANE_DEFAULT, LANE_GAME)
+
+LANE_BY_ENDPOINT = {
+    "banChatMember": LANE_MODERATION,
+    "unbanChatMember": LANE_MODERATION,
+    "restrictChatMember": LANE_MODERATION,
+    "deleteMessage": LANE_MODERATION,
+    "deleteMessages": LANE_MODERATION,
+}
+
+# Не проходят через очередь
+UNTHROTTLED_PREFIXES = ("get", "answer", "setMy", "deleteWebhook", "logOut", "close")
+
+# Расходуют темп чата
+SEND_PREFIXES = ("send", "copy", "forward", "edit")
+
+# Правки, которые склеиваются (одинаковый метод + чат + сообщение)
+COALESCED_ENDPOINTS = {"editMessageText", "editMessageCaption", "editMessageReplyMarkup"}
+
+
+class _Pace:
+    """
+    Ведро: capacity запросов, пополняется на rate в секунду; paused_until — пауза после RetryAfter.
+    """
+    __slots__ = ("capacity", "rate", "tokens", "updated", "paused_until")
+
+    def __init__(self, capacity, rate, now):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = now
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Когда можно отправить (paced=False — только пауза, без расхода темпа)
+    def ready_at(self, now, paced=True):
+        if not paced:
+            return self.paused_until
+        self._refill(now)
+        if self.tokens >= 1:
+            return self.paused_until
+        return max(self.paused_until, now + (1 - self.tokens) / self.rate)
+
+    def take(self):
+        self.tokens -= 1
+
+    def is_idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity and self.paused_until <= now
+
+
+class _Waiter:
+    __slots__ = ("chat_id", "paced", "grant", "edit_key", "result", "newer")
+
+    def __init__(self, chat_id, paced, edit_key):
+        self.chat_id = chat_id
+        self.paced = paced
+        # Разрешение на отправку: None — отправлять, future — вызов склеен с более новой правкой
+        self.grant = None
+        self.edit_key = edit_key
+        # Результат для склеенных с этим вызовом (создаётся только при склейке)
+        self.result = None
+        # Результат более новой правки, пришедшей, пока эта уже отправлялась (вместо повтора после RetryAfter)
+        self.newer = None
+
+
+class OutboundScheduler(BaseRateLimiter):
+    __slots__ = ("_lanes", "_global", "_chats", "_edits", "_wakeup", "_task", "_last_sweep", "_loop")
+
+    def __init__(self):
+        self._lanes = {lane: deque() for lane in LANES}
+        self._global = None
+        self._chats = {}   # chat_id -> _Pace
+        self._edits = {}   # (метод, chat_id, message_id) -> самая новая ждущая или отправляемая правка
+        self._wakeup = None
+        self._task = None
+        self._last_sweep = 0.0
+        self._loop = None
+
+    async def initialize(self):
+        self._loop = asyncio.get_running_loop()
+        self._global = _Pace(GLOBAL_RATE, GLOBAL_RATE, self._loop.time())
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._dispatch(), name="outbound_scheduler")
+
+    async def shutdown(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Всё, что ждало очереди, отправляется сразу — при остановке не теряем сообщения
+        for lane in self._lanes.values():
+            while lane:
+                waiter = lane.popleft()
+                if not waiter.grant.done():
+                    waiter.grant.set_result(None)
+        self._edits.clear()
+
+    def _chat_pace(self, chat_id, now):
+        pace = self._chats.get(chat_id)
+        if pace is None:
+            # Отрицательный ID (или @username) — группа/канал, положительный — ЛС
+            if isinstance(chat_id, int) and chat_id > 0:
+                pace = _Pace(PRIVATE_BURST, PRIVATE_RATE, now)
+            else:
+                pace = _Pace(GROUP_BURST, GROUP_RATE / 60, now)
+            self._chats[chat_id] = pace
+        return pace
+
+    def _sweep(self, now):
+        if now - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        waiting = {waiter.chat_id for lane in self._lanes.values() for waiter in lane}
+        for chat_id in [c for c, pace in self._chats.items() if c not in waiting and pace.is_idle(now)]:
+            del self._chats[chat_id]
+
+    # Первый по приоритету запрос, который можно отправить сейчас; иначе — через сколько секунд проверить снова
+    def _next_ready(self, now):
+        global_at = self._global.ready_at(now)
+        earliest = None
+        for lane in self._lanes.values():
+            while lane and lane[0].grant.done():
+                self._forget_edit(lane.popleft())  # Склеенные правки и отменённые вызовы
+            for waiter in lane:
+                if waiter.grant.done():
+                    continue
+                pace = self._chat_pace(waiter.chat_id, now)
+                at = max(global_at, pace.ready_at(now, waiter.paced))
+                if at <= now:
+                    lane.remove(waiter)
+                    self._global.take()
+                    if waiter.paced:
+                        pace.take()
+                    return waiter, None
+                if earliest is None or at < earliest:
+                    earliest = at
+        return None, None if earliest is None else earliest - now
+
+    def _forget_edit(self, waiter):
+        if waiter.edit_key is not None and self._edits.get(waiter.edit_key) is waiter:
+            del self._edits[waiter.edit_key]
+
+    async def _dispatch(self):
+        while True:
+            now = self._loop.time()
+            self._sweep(now)
+            waiter, delay = self._next_ready(now)
+            if waiter is not None:
+                waiter.grant.set_result(None)
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _enqueue(self, waiter, lane):
+        waiter.grant = self._loop.create_future()
+        if waiter.edit_key is not None:
+            previous = self._edits.get(waiter.edit_key)
+            if previous is not None and previous is not waiter:
+                if waiter.result is None:
+                    waiter.result = self._loop.create_future()
+                if not previous.grant.done():
+                    # Старая правка ещё в очереди — она не отправится, а получит результат новой
+                    previous.grant.set_result(waiter.result)
+                else:
+                    # Старая уже отправляется — при RetryAfter она не повторится, а получит результат новой
+                    previous.newer = waiter.result
+            self._edits[waiter.edit_key] = waiter
+        self._lanes[lane].append(waiter)
+        self._wakeup.set()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        if self._task is None or chat_id is None or endpoint.startswith(UNTHROTTLED_PREFIXES):
+            return await callback(*args, **kwargs)
+
+        lane = rate_limit_args if rate_limit_args in self._lanes else LANE_BY_ENDPOINT.get(endpoint, LANE_DEFAULT)
+        edit_key = None
+        if endpoint in COALESCED_ENDPOINTS and data.get("message_id"):
+            edit_key = (endpoint, chat_id, data["message_id"])
+        waiter = _Waiter(chat_id, endpoint.startswith(SEND_PREFIXES), edit_key)
+
+        try:
+            for attempt in range(MAX_RETRIES + 1):
+                self._enqueue(waiter, lane)
+                newer = await waiter.grant
+                if newer is not None:
+                    return await self._settle(waiter, newer)
+                try:
+                    result = await callback(*args, **kwargs)
+                except RetryAfter as e:
+                    now = self._loop.time()
+                    pace = self._chat_pace(chat_id, now)
+                    pace.paused_until = max(pace.paused_until, now + e.retry_after)
+                    if waiter.newer is not None:
+                        # За это время пришла более новая правка — повтор устаревшего текста не нужен
+                        return await self._settle(waiter, waiter.newer)
+                    if attempt == MAX_RETRIES:
+                        self._resolve(waiter, error=e)
+                        raise
+                    logging.warning(f"[OUTBOUND] {endpoint} в чат {chat_id}: RetryAfter {e.retry_after} сек, повтор {attempt + 1}")
+                    continue
+                except Exception as e:
+                    self._resolve(waiter, error=e)
+                    raise
+                self._resolve(waiter, value=result)
+                return result
+        finally:
+            self._forget_edit(waiter)
+
+    # Вызов склеен с более новой правкой: ждём её результат и передаём дальше по цепочке
+    async def _settle(self, waiter, newer):
+        try:
+            result = await newer
+        except Exception as e:
+            self._resolve(waiter, error=e)
+            raise
+        self._resolve(waiter, value=result)
+        return result
+
+    @staticmethod
+    def _resolve(waiter, value=None, error=None):
+        result = waiter.result
+        if result is None or result.done():
+            return
+        if error is not None:
+            result.set_exception(error)
+            result.exception()  # Ошибку получат ждущие вызовы — без предупреждения "never retrieved"
+        else:
+            result.set_result(value)
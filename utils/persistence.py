@@ -0,0 +1,197 @@
+"""
+Общий слой записи на диск: атомарные записи и отложенная пакетная запись в отдельном потоке.
+
+- atomic_write_bytes(): запись во временный файл + fsync + os.replace — сбой посреди записи
+  не оставляет обрезанный файл (остаётся прежняя версия).
+- schedule_write(key, prepare): изменение помечает ключ (обычно путь файла) "грязным".
+  Через WRITE_DELAY секунд все грязные ключи записываются одним заходом; сколько бы изменений
+  ни пришло за это время, на ключ будет одна запись (побеждает последнее состояние).
+  prepare() вызывается в event loop и забирает накопленные данные; возвращает (write, done, failed):
+    write()       — сама запись, выполняется в потоке записи (по одному, в порядке очереди);
+    done(result)  — вызывается в event loop после успешной записи (может быть None);
+    failed()      — вызывается в event loop при ошибке: вернуть забранные данные в начало
+                    очереди (может быть None, если prepare делает полный снимок).
+  При ошибке запись повторяется через RETRY_DELAY секунд (или раньше — в flush_writes).
+  По одному ключу в потоке записи не бывает двух записей сразу: пока идёт предыдущая,
+  новые изменения ждут — порядок сохраняется, одни и те же данные не пишутся дважды.
+- drain_writes(): дописать всё из хэндлера (перед чтением, которому нужны все данные на диске),
+  не блокируя event loop.
+- run_io(fn, *args): выполнить чтение с диска в потоке записи (после уже отправленных записей),
+  не блокируя event loop.
+- flush_writes(): синхронно дописывает всё — только при остановке/перезапуске бота
+  и без работающего event loop (тогда запись сразу синхронная).
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Сколько секунд копятся изменения перед записью
+WRITE_DELAY = 1.0
+
+# Через сколько секунд повторить неудавшуюся запись
+RETRY_DELAY = 30
+
+# Один поток записи: записи выполняются строго по очереди
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage-writer")
+
+# Ключ -> prepare (порядок вставки = порядок записи)
+_dirty = {}
+
+# Записи, отправленные в поток: [future, key, prepare, done, failed, обработана ли]
+_inflight = []
+
+# Ключ -> prepare для записей, ждущих повтора после ошибки (их допишет и flush_writes)
+_retrying = {}
+
+_flush_handle = None
+
+
+def atomic_write_bytes(path: str, data: bytes):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def schedule_write(key, prepare):
+    global _flush_handle
+    _dirty[key] = prepare
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        flush_writes()
+        return
+    if _flush_handle is None:
+        _flush_handle = loop.call_later(WRITE_DELAY, _flush_async, loop)
+
+
+def _retry_later(key, prepare, error):
+    logging.error(f"[STORAGE] Ошибка записи {key}: {type(error).__name__} - {error}")
+    try:
+        asyncio.get_running_loop().call_later(RETRY_DELAY, _requeue, key)
+    except RuntimeError:
+        _dirty.setdefault(key, prepare)  # Останется до следующего flush_writes
+        return
+    _retrying[key] = prepare
+
+
+def _requeue(key):
+    prepare = _retrying.pop(key, None)
+    if prepare is not None and key not in _dirty:
+        schedule_write(key, prepare)
+
+
+def _is_writing(key) -> bool:
+    return any(record[1] == key for record in _inflight)
+
+
+def _flush_async(loop):
+    global _flush_handle
+    _flush_handle = None
+    batch = list(_dirty.items())
+    _dirty.clear()
+
+    for key, prepare in batch:
+        if _is_writing(key):
+            # Предыдущая запись этого ключа ещё идёт — запишем после неё (см. _complete)
+            _dirty[key] = prepare
+            continue
+        write, done, failed = prepare()
+        future = _executor.submit(write)
+        record = [future, key, prepare, done, failed, False]
+        _inflight.append(record)
+        asyncio.wrap_future(future, loop=loop).add_done_callback(
+            lambda wrapped, record=record: _on_written(record, wrapped)
+        )
+
+
+def _on_written(record, wrapped):
+    if not wrapped.cancelled():
+        wrapped.exception()  # Ошибку обработает _complete — без предупреждения "never retrieved"
+    _complete(record)
+
+
+def _complete(record):
+    global _flush_handle
+    future, key, prepare, done, failed, handled = record
+    if handled:
+        return  # Уже обработана в flush_writes
+    record[5] = True
+    _inflight.remove(record)
+
+    error = future.exception()
+    if error:
+        if failed:
+            failed()
+        _retry_later(key, prepare, error)
+    elif done:
+        done(future.result())
+
+    # Изменения, ждавшие окончания этой записи
+    if key in _dirty:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Допишет flush_writes
+        if _flush_handle is None:
+            _flush_handle = loop.call_soon(_flush_async, loop)
+
+
+# Дописать всё из хэндлера: запись идёт в потоке, event loop не блокируется
+async def drain_writes():
+    loop = asyncio.get_running_loop()
+    while _inflight or _dirty:
+        if _dirty:
+            if _flush_handle is not None:
+                _flush_handle.cancel()
+            _flush_async(loop)
+        if _inflight:
+            # Ошибки записи обрабатывает _complete (повтор) — здесь только ждём
+            await asyncio.gather(
+                *(asyncio.wrap_future(record[0], loop=loop) for record in _inflight),
+                return_exceptions=True
+            )
+        await asyncio.sleep(0)  # Даём отработать _complete
+
+
+# Чтение с диска из хэндлера: в потоке записи, после уже отправленных в него записей
+async def run_io(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+# Синхронно дописать всё: дождаться записей в потоке и выполнить отложенные.
+# Блокирует event loop — только при остановке бота и вне event loop
+def flush_writes():
+    for record in list(_inflight):
+        try:
+            record[0].result()
+        except Exception:
+            pass
+        _complete(record)
+
+    # Записи, ждущие повтора, не откладываем — пробуем сейчас
+    for key, prepare in _retrying.items():
+        _dirty.setdefault(key, prepare)
+    _retrying.clear()
+
+    while _dirty:
+        key = next(iter(_dirty))
+        prepare = _dirty.pop(key)
+        write, done, failed = prepare()
+        try:
+            result = write()
+        except Exception as e:
+            logging.error(f"[STORAGE] Ошибка записи {key}: {type(e).__name__} - {e}")
+            if failed:
+                failed()
+            _dirty[key] = prepare
+            break
+        if done:
+            done(result)
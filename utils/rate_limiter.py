@@ -0,0 +1,240 @@
+"""
+Ограничение частоты команд и inline-кнопок (token bucket).
+
+Лимиты описываются в одном месте (RATE_LIMITS) и проверяются одним хэндлером в группе -1 —
+после кэша сообщений и статистики групп, но до ConversationHandler и команд. Отклонённый
+апдейт дальше не обрабатывается (ApplicationHandlerStop), поэтому спам кнопками "🔄 Обновить"
+не тратит запросы к Bot API.
+
+- Лимит: capacity вызовов за period секунд (ведро пополняется равномерно).
+- Лимит с in_handler=True проверяет сам хэндлер команды (check_rate_limit) после разбора
+  аргументов — вызов с ошибкой в аргументах лимит не расходует.
+- Область: "user" — отдельное ведро на пользователя в чате, "chat" — общее на чат,
+  "global" — одно на весь бот. На одну команду может быть несколько лимитов сразу.
+- Ведро, которое успело заполниться целиком, ничем не отличается от нового — такие вёдра
+  удаляются (не чаще раза в SWEEP_INTERVAL), поэтому память не растёт с числом пользователей.
+- Счётчики отклонённых вызовов — get_rejection_stats() (показываются в !debug-all).
+
+Бан-кулдауны админов живут отдельно (handlers/admin/cooldown_admin.py): они переживают
+перезапуск бота и зависят от уровня админа.
+"""
+
+import logging
+import time
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import ApplicationHandlerStop
+from utils.message_traits import get_traits
+
+# Как часто (в секундах) удаляются заполнившиеся вёдра
+SWEEP_INTERVAL = 60
+
+# Пользователи без ограничений
+TRUSTED_IDS = [5403794760]
+
+SCOPE_USER = "user"
+SCOPE_CHAT = "chat"
+SCOPE_GLOBAL = "global"
+
+
+class RateLimit:
+    """
+    capacity вызовов за period секунд в области scope.
+    in_handler=True — лимит проверяет сам хэндлер (check_rate_limit), когда аргументы уже
+    разобраны: подсказка по использованию и неверные аргументы лимит не расходуют.
+    message — ответ при отказе (None — стандартный, с временем ожидания).
+    """
+    __slots__ = ("scope", "capacity", "period", "in_handler", "message", "rate")
+
+    def __init__(self, scope, capacity, period, in_handler=False, message=None):
+        self.scope = scope
+        self.capacity = capacity
+        self.period = period
+        self.in_handler = in_handler
+        self.message = message
+        self.rate = capacity / period  # Пополнение: вызовов в секунду
+
+
+# 🚦 Лимиты: "!команда" или префикс callback_data ("group_") -> список лимитов
+RATE_LIMITS = {
+    # 🧹 Очистка — раз в час на чат
+    "!clear-cmd": [
+        RateLimit(SCOPE_CHAT, 1, 60 * 60, in_handler=True,
+                  message="⏱ Вы можете использовать эту команду раз в час."),
+    ],
+
+    # 📋 Панели со статистикой и страницами
+    "!group": [RateLimit(SCOPE_USER, 3, 30), RateLimit(SCOPE_CHAT, 10, 60)],
+    "!help": [RateLimit(SCOPE_USER, 3, 30)],
+    "!rules": [RateLimit(SCOPE_USER, 3, 30)],
+    "group_": [RateLimit(SCOPE_USER, 5, 15), RateLimit(SCOPE_CHAT, 20, 60)],
+    "help_": [RateLimit(SCOPE_USER, 10, 15)],
+    "rules_": [RateLimit(SCOPE_USER, 10, 15)],
+
+    # 🔫 Рулетка
+    "!roulette": [RateLimit(SCOPE_CHAT, 3, 60)],
+    "!join": [RateLimit(SCOPE_USER, 3, 30)],
+    "!startgame": [RateLimit(SCOPE_CHAT, 3, 60)],
+    "!endgame": [RateLimit(SCOPE_CHAT, 3, 60)],
+    "!shoot": [RateLimit(SCOPE_USER, 5, 10), RateLimit(SCOPE_CHAT, 20, 60)],
+    "!shootme": [RateLimit(SCOPE_USER, 5, 10), RateLimit(SCOPE_CHAT, 20, 60)],
+
+    # 🖥 Тяжёлые отчёты (графики, сбор метрик)
+    "!status": [RateLimit(SCOPE_GLOBAL, 6, 60)],
+    "!debug-all": [RateLimit(SCOPE_GLOBAL, 6, 60)],
+}
+
+# Префиксы callback_data, для которых есть лимиты
+_CALLBACK_PREFIXES = tuple(key for key in RATE_LIMITS if not key.startswith("!"))
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "notified")
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+        self.notified = False  # Сообщали ли об отказе с момента последнего успешного вызова
+
+
+# (ключ лимита, номер лимита, chat_id, user_id) -> _Bucket
+_buckets = {}
+
+# Ключ лимита -> кол-во отклонённых вызовов
+_rejections = {}
+
+_last_sweep = 0.0
+
+
+def _refill(bucket, limit, now):
+    bucket.tokens = min(limit.capacity, bucket.tokens + (now - bucket.updated) * limit.rate)
+    bucket.updated = now
+
+
+def _bucket_key(name, index, limit, chat_id, user_id):
+    if limit.scope == SCOPE_USER:
+        return name, index, chat_id, user_id
+    if limit.scope == SCOPE_CHAT:
+        return name, index, chat_id, None
+    return name, index, None, None
+
+
+def _sweep(now):
+    """
+    Удаляет заполнившиеся вёдра (не чаще раза в SWEEP_INTERVAL).
+    """
+    global _last_sweep
+    if now - _last_sweep < SWEEP_INTERVAL:
+        return
+    _last_sweep = now
+    full = []
+    for key, bucket in _buckets.items():
+        limit = RATE_LIMITS[key[0]][key[1]]
+        if bucket.tokens + (now - bucket.updated) * limit.rate >= limit.capacity:
+            full.append(key)
+    for key in full:
+        del _buckets[key]
+    if full:
+        logging.debug(f"[RATE_LIMIT] Удалено заполнившихся вёдер: {len(full)}, осталось: {len(_buckets)}")
+
+
+def acquire(name, chat_id, user_id, in_handler=False):
+    """
+    Пытается списать вызов со всех лимитов name (in_handler=True — с тех, что проверяет хэндлер).
+    Возвращает None, если вызов разрешён, иначе (лимит, секунд до следующего вызова, сообщали ли уже).
+    Вызов списывается только если проходят все лимиты — отказ по одному не тратит остальные.
+    """
+    limits = RATE_LIMITS.get(name)
+    if not limits or user_id in TRUSTED_IDS:
+        return None
+
+    now = time.monotonic()
+    _sweep(now)
+
+    charged = []
+    for index, limit in enumerate(limits):
+        if limit.in_handler != in_handler:
+            continue
+        key = _bucket_key(name, index, limit, chat_id, user_id)
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = _Bucket(limit.capacity, now)
+        else:
+            _refill(bucket, limit, now)
+
+        if bucket.tokens < 1:
+            _rejections[name] = _rejections.get(name, 0) + 1
+            notified = bucket.notified
+            bucket.notified = True
+            return limit, (1 - bucket.tokens) / limit.rate, notified
+        charged.append(bucket)
+
+    for bucket in charged:
+        bucket.tokens -= 1
+        bucket.notified = False
+    return None
+
+
+def _format_wait(seconds):
+    seconds = max(1, int(seconds + 0.999))
+    mins, secs = divmod(seconds, 60)
+    if mins >= 60:
+        hrs, mins = divmod(mins, 60)
+        return f"{hrs} ч {mins} мин"
+    if mins:
+        return f"{mins} мин {secs} сек"
+    return f"{secs} сек"
+
+
+# Хэндлер группы -1: отклоняет слишком частые команды и нажатия кнопок
+async def rate_limit_handler(update: Update, context):
+    query = update.callback_query
+    if query:
+        if not query.data or not query.data.startswith(_CALLBACK_PREFIXES):
+            return
+        name = query.data.split("_", 1)[0] + "_"
+        chat_id = query.message.chat.id if query.message else None
+        rejected = acquire(name, chat_id, query.from_user.id)
+        if rejected is None:
+            return
+        limit, wait, _ = rejected
+        try:
+            await query.answer(limit.message or f"⏱ Слишком часто. Подождите {_format_wait(wait)}.")
+        except TelegramError as e:
+            logging.debug(f"[RATE_LIMIT] Не удалось ответить на callback: {e}")
+        raise ApplicationHandlerStop
+
+    if not update.message:
+        return
+    traits = get_traits(update)
+    if not traits or not traits.is_bang_command or traits.command not in RATE_LIMITS:
+        return
+
+    if not await check_rate_limit(update, traits.command):
+        raise ApplicationHandlerStop
+
+
+async def check_rate_limit(update: Update, name, in_handler=False) -> bool:
+    """
+    Списывает вызов команды name; при отказе отвечает на сообщение и возвращает False.
+    Хэндлер вызывает с in_handler=True после проверки аргументов.
+    """
+    user = update.effective_user
+    rejected = acquire(name, update.effective_chat.id, user.id if user else None, in_handler)
+    if rejected is None:
+        return True
+    limit, wait, notified = rejected
+    # О превышении сообщаем один раз (кроме собственного текста лимита) — дальше отказы молча
+    if limit.message or not notified:
+        try:
+            await update.message.reply_text(
+                limit.message or f"⏱ Слишком часто. Подождите {_format_wait(wait)}."
+            )
+        except TelegramError as e:
+            logging.debug(f"[RATE_LIMIT] Не удалось ответить на команду: {e}")
+    return False
+
+
+# Отклонённые вызовы: [(команда или кнопка, кол-во)] — по убыванию
+def get_rejection_stats():
+    return sorted(_rejections.items(), key=lambda item: item[1], reverse=True)
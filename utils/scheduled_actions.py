@@ -0,0 +1,151 @@
+"""
+Отложенные действия бота (разбан, снятие мута и т.п.), которые переживают перезапуск.
+
+- Очередь — куча (heapq) по времени выполнения: проверка "есть ли что выполнять" стоит O(1).
+- Очередь хранится в database/scheduled_actions.json (атомарная запись через utils/persistence.py)
+  и загружается при старте.
+- JobQueue раз в SCHEDULER_TICK секунд выполняет все действия, время которых пришло
+  (включая просроченные, пока бот был выключен).
+- Временная ошибка Telegram (сеть, таймаут, RetryAfter) — действие возвращается в очередь
+  с нарастающей задержкой (до MAX_ATTEMPTS попыток). BadRequest/Forbidden — действие
+  выполнить невозможно, оно удаляется с записью в лог.
+
+Модуль, которому нужно отложенное действие, регистрирует обработчик:
+    register_action("unban", unban_action)      # async def unban_action(bot, payload)
+и ставит задачу:
+    schedule_action("unban", time.time() + 3600, {"chat_id": ..., "user_id": ...})
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+from telegram.error import BadRequest, ChatMigrated, Forbidden, RetryAfter, TelegramError
+from utils.persistence import atomic_write_bytes, schedule_write
+
+SCHEDULE_DB = "database/scheduled_actions.json"
+
+# Как часто (в секундах) JobQueue проверяет очередь
+SCHEDULER_TICK = 5
+
+# Повторы после временной ошибки: задержка RETRY_DELAY * 2^попытка (не больше MAX_RETRY_DELAY)
+RETRY_DELAY = 30
+MAX_RETRY_DELAY = 60 * 60
+MAX_ATTEMPTS = 10
+
+# Ошибки, после которых повтор бесполезен
+PERMANENT_ERRORS = (BadRequest, Forbidden, ChatMigrated)
+
+# Обработчики действий: имя -> async def handler(bot, payload)
+_action_handlers = {}
+
+# 🧠 Куча: (время_выполнения, порядковый_номер, имя_действия, payload, неудачных_попыток)
+_queue = None
+
+# Порядковый номер — чтобы действия с одинаковым временем не сравнивались по payload
+_sequence = itertools.count()
+
+
+def load_scheduled_actions():
+    if not os.path.exists(SCHEDULE_DB):
+        return []
+    with open(SCHEDULE_DB, "r", encoding="utf-8") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            logging.error(f"Повреждён файл {SCHEDULE_DB} — отложенные действия потеряны")
+            return []
+
+
+def save_scheduled_actions(entries: list):
+    atomic_write_bytes(SCHEDULE_DB, json.dumps(entries, ensure_ascii=False).encode("utf-8"))
+
+
+def _get_queue():
+    global _queue
+    if _queue is None:
+        _queue = [
+            (entry["run_at"], next(_sequence), entry["action"], entry["payload"], entry.get("attempts", 0))
+            for entry in load_scheduled_actions()
+        ]
+        heapq.heapify(_queue)
+    return _queue
+
+
+# Запись очереди — атомарно, в потоке записи, несколько изменений подряд дают одну запись
+def _persist():
+    schedule_write(SCHEDULE_DB, _prepare_persist)
+
+
+def _prepare_persist():
+    entries = [
+        {"run_at": run_at, "action": action, "payload": payload, "attempts": attempts}
+        for run_at, _, action, payload, attempts in _get_queue()
+    ]
+    return lambda: save_scheduled_actions(entries), None, None
+
+
+# Регистрация обработчика действия (вызывается при импорте модуля-владельца)
+def register_action(name: str, handler):
+    _action_handlers[name] = handler
+
+
+# Поставить действие в очередь: run_at — unix-время выполнения
+def schedule_action(name: str, run_at: float, payload: dict):
+    heapq.heappush(_get_queue(), (run_at, next(_sequence), name, payload, 0))
+    _persist()
+
+
+def pending_actions_count() -> int:
+    return len(_get_queue())
+
+
+# Вернуть действие в очередь после неудачной попытки (False — попытки исчерпаны)
+def _retry_later(name, payload, attempts, delay=None):
+    if attempts >= MAX_ATTEMPTS:
+        logging.error(f"[SCHEDULER] Действие {name!r} удалено после {attempts} неудачных попыток: {payload}")
+        return False
+    if delay is None:
+        delay = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+    heapq.heappush(_get_queue(), (time.time() + delay, next(_sequence), name, payload, attempts))
+    logging.warning(f"[SCHEDULER] Действие {name!r} повторится через {delay:.0f} сек (попытка {attempts}): {payload}")
+    return True
+
+
+# Выполнить все действия, время которых наступило
+async def run_due_actions(bot):
+    queue = _get_queue()
+    now = time.time()
+    executed = 0
+
+    while queue and queue[0][0] <= now:
+        _, _, name, payload, attempts = heapq.heappop(queue)
+        executed += 1
+        handler = _action_handlers.get(name)
+        if handler is None:
+            # Модуль-владелец мог ещё не зарегистрировать обработчик — не теряем действие сразу
+            logging.error(f"[SCHEDULER] Неизвестное действие {name!r}: {payload}")
+            _retry_later(name, payload, attempts + 1)
+            continue
+        try:
+            await handler(bot, payload)
+        except PERMANENT_ERRORS as e:
+            logging.error(f"[SCHEDULER] Действие {name!r} невыполнимо и удалено ({payload}): {type(e).__name__} - {e}")
+        except RetryAfter as e:
+            _retry_later(name, payload, attempts + 1, delay=e.retry_after)
+        except TelegramError as e:
+            logging.error(f"[SCHEDULER] Временная ошибка действия {name!r} ({payload}): {type(e).__name__} - {e}")
+            _retry_later(name, payload, attempts + 1)
+        except Exception as e:
+            logging.exception(f"[SCHEDULER] Ошибка действия {name!r} — удалено ({payload}): {type(e).__name__} - {e}")
+
+    if executed:
+        _persist()
+    return executed
+
+
+# Задача для JobQueue
+async def run_due_actions_job(context):
+    await run_due_actions(context.bot)
@@ -1,12 +1,19 @@
 from telegram.ext import (
-    MessageHandler, CommandHandler, CallbackQueryHandler, ConversationHandler, Application
+    MessageHandler, CommandHandler, CallbackQueryHandler, ConversationHandler, ChatMemberHandler, TypeHandler,
+    Application
 )
+from telegram import Update
 from telegram.ext import filters
 from datetime import datetime
 
 # Импорт хэндлеров
 from handlers.prefix import prefix_handler, register_user
 from handlers.group import group_handler, group_callback_handler
+from handlers.group_stats_updater import group_stats_handler_obj
+from utils.member_cache import track_chat_member
+from utils.command_router import CommandRouter
+from utils.rate_limiter import rate_limit_handler
+from utils.message_traits import BANG_COMMAND, PLAIN_TEXT, GROUP_PLAIN_TEXT, PRIVATE_TEXT
 from handlers.admin.add_admin import add_admin_handler
 from handlers.admin.list_admins import list_admins_handler
 from handlers.admin.remove_admin import remove_admin_handler
@@ -15,8 +22,8 @@ from handlers.funny.echo.mute_random import mute_random_handler
 from handlers.help_bot import help_handler, help_callback_handler
 from handlers.status import status_command, debugall_command
 from handlers.creator_bot.export_database import export_db_conv_handler, export_db_handler_immediate
-from handlers.admin.clear_cmd import clear_cmd_handler_obj, cache_handler_obj
-from handlers.creator_bot.restart_bot import restart_handler
+from handlers.admin.clear_cmd import clear_cmd_handler, cache_handler_obj
+from handlers.creator_bot.restart_bot import restart_bot_handler
 from handlers.rules_bot import (
     rules_handler, rules_callback_handler, set_rules_start,
     set_rules_receive_page, set_rules_receive_text, set_rules_cancel,
@@ -34,7 +41,12 @@ from handlers.funny.echo.chat_bot import (
 
 """
 ✅ Принцип работы group=N:
-group=0: критически важные хэндлеры (кэш, логирование)
+group=-3, -2: учёт, который видит каждое сообщение (кэш для !clear-cmd, статистика групп) —
+  до ограничения частоты, поэтому отклонённые команды тоже учитываются
+
+group=-1: ограничение частоты команд и кнопок (utils/rate_limiter.py) — отклонённое дальше не идёт
+
+group=0: критически важные хэндлеры (статусы участников)
 
 group=1: разговорные хэндлеры, которые требуют исключительности (ConversationHandler)
 
@@ -59,12 +71,21 @@ async def register_user_handler(update, context):
 
 
 def setup_all_handlers(app: Application):
-    # 0. Cache-сборщик сообщений
-    app.add_handler(cache_handler_obj, group=0)
+    # -3. Cache-сборщик сообщений
+    app.add_handler(cache_handler_obj, group=-3)
+
+    # -2. Статистика групп (учитываются все новые сообщения участников, включая команды и отклонённые лимитом)
+    app.add_handler(group_stats_handler_obj, group=-2)
+
+    # -1. Лимиты частоты команд и inline-кнопок
+    app.add_handler(TypeHandler(Update, rate_limit_handler), group=-1)
+
+    # 0. Обновления статусов участников (ChatMemberUpdated) — поддерживают кэш get_chat_member
+    app.add_handler(ChatMemberHandler(track_chat_member, ChatMemberHandler.ANY_CHAT_MEMBER), group=0)
 
     # 1. ConversationHandler (!set-rules)
     set_rules_conv = ConversationHandler(
-        entry_points=[MessageHandler(filters.TEXT & filters.Regex(r"^!set-rules"), set_rules_start)],
+        entry_points=[MessageHandler(BANG_COMMAND & filters.Regex(r"^!set-rules"), set_rules_start)],
         states={
             0: [MessageHandler(filters.TEXT & filters.Regex(r"^\d+$"), set_rules_receive_page)],
             1: [MessageHandler(filters.TEXT & ~filters.COMMAND, set_rules_receive_text)]
@@ -75,28 +96,33 @@ def setup_all_handlers(app: Application):
     )
     app.add_handler(set_rules_conv, group=1)
 
-    # 2. Команды (!group, !help и др.)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!group"), group_handler), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!prefix"), prefix_handler), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!help"), help_handler), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!rules"), rules_handler), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!del-rules"), delete_rules_handler), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!status"), status_command), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!debug-all"), debugall_command), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!add-admin"), add_admin_handler), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!admins"), list_admins_handler), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!del-admin"), remove_admin_handler), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!ban"), ban_handler), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!roulette"), roulette_handler), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!join"), join_handler), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!startgame"), start_game_handler), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!endgame"), endgame_handler), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!shootme"), shootme_handler), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!shoot"), shoot_handler), group=2)
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!export_db(?:\s|$).+"), export_db_handler_immediate), group=2)
+    # 2. Команды (!group, !help и др.) — один диспетчер, поиск по первому слову сообщения
+    command_router = CommandRouter({
+        "!group": group_handler,
+        "!prefix": prefix_handler,
+        "!help": help_handler,
+        "!rules": rules_handler,
+        "!del-rules": delete_rules_handler,
+        "!status": status_command,
+        "!debug-all": debugall_command,
+        "!add-admin": add_admin_handler,
+        "!admins": list_admins_handler,
+        "!del-admin": remove_admin_handler,
+        "!ban": ban_handler,
+        "!roulette": roulette_handler,
+        "!join": join_handler,
+        "!startgame": start_game_handler,
+        "!endgame": endgame_handler,
+        "!shoot": shoot_handler,
+        "!shootme": shootme_handler,
+        "!clear-cmd": clear_cmd_handler,
+    })
+    # !restart — только точная команда, без аргументов
+    command_router.add("!restart", restart_bot_handler, no_args=True)
+    # !export_db с аргументом — сразу, без аргумента — через ConversationHandler ниже
+    command_router.add("!export_db", export_db_handler_immediate, needs_args=True)
+    app.add_handler(command_router, group=2)
     app.add_handler(export_db_conv_handler, group=2)
-    app.add_handler(clear_cmd_handler_obj, group=2)
-    app.add_handler(restart_handler, group=2)
 
     # 3. Callback кнопки
     app.add_handler(CallbackQueryHandler(group_callback_handler, pattern="^group_"), group=3)
@@ -114,11 +140,12 @@ def setup_all_handlers(app: Application):
     app.add_handler(MessageHandler(filters.PHOTO & filters.CaptionRegex(r"^/send_photo\s+\d+"), send_photo_caption_handler), group=4)
     app.add_handler(MessageHandler(filters.VIDEO & filters.CaptionRegex(r"^/send_video\s+\d+"), send_video_caption_handler), group=4)
 
+    # Группы 5-7 фильтруются по признакам сообщения (utils/message_traits.py) — считаются один раз на апдейт
     # 6. Сообщения в ЛС
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, private_message_handler), group=5)
+    app.add_handler(MessageHandler(PRIVATE_TEXT, private_message_handler), group=5)
 
     # 7. Прочее в группах
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.Regex(r"^!"), mute_random_handler), group=6)
+    app.add_handler(MessageHandler(GROUP_PLAIN_TEXT, mute_random_handler), group=6)
 
     # 8. Регистрация пользователей (в самом конце)
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.Regex(r"^!"), register_user_handler), group=7)
+    app.add_handler(MessageHandler(PLAIN_TEXT, register_user_handler), group=7)
@@ -1,3 +1,62 @@
-# Пока заглушка — для совместимости с post_init
+from utils.users import flush_users, flush_users_job, USERS_FLUSH_INTERVAL
+from utils.chat_journal import compact_journal_job, COMPACT_INTERVAL
+from handlers.admin.cooldown_admin import flush_cooldowns, flush_cooldowns_job, COOLDOWN_FLUSH_INTERVAL
+from handlers.group_stats_updater import flush_stats, flush_stats_job, STATS_FLUSH_INTERVAL
+from utils.scheduled_actions import run_due_actions_job, SCHEDULER_TICK
+from utils.storage import close_storage
+from utils.metrics import sample_system_job, sample_processes_job, SAMPLE_INTERVAL, PROCESS_SAMPLE_INTERVAL
+
+
+# Регистрация фоновых задач бота — вызывается из post_init
 async def setup_jobqueue(app):
-    pass
+    # ⏰ Отложенные действия (разбаны и т.п.) — сразу при старте выполняются просроченные
+    app.job_queue.run_repeating(
+        run_due_actions_job,
+        interval=SCHEDULER_TICK,
+        first=0,
+        name="scheduled_actions"
+    )
+
+    # 🖥 Фоновый сбор системных метрик для !status и !debug-all
+    app.job_queue.run_repeating(sample_system_job, interval=SAMPLE_INTERVAL, first=0, name="sample_system")
+    app.job_queue.run_repeating(sample_processes_job, interval=PROCESS_SAMPLE_INTERVAL, first=0, name="sample_processes")
+
+    # 👤 Отложенная запись справочника пользователей
+    app.job_queue.run_repeating(
+        flush_users_job,
+        interval=USERS_FLUSH_INTERVAL,
+        first=USERS_FLUSH_INTERVAL,
+        name="flush_users"
+    )
+
+    # ⏳ Отложенная запись кулдаунов админов
+    app.job_queue.run_repeating(
+        flush_cooldowns_job,
+        interval=COOLDOWN_FLUSH_INTERVAL,
+        first=COOLDOWN_FLUSH_INTERVAL,
+        name="flush_cooldowns"
+    )
+
+    # 📈 Периодический снимок статистики групп
+    app.job_queue.run_repeating(
+        flush_stats_job,
+        interval=STATS_FLUSH_INTERVAL,
+        first=STATS_FLUSH_INTERVAL,
+        name="flush_group_stats"
+    )
+
+    # 📜 Сжатие закрытых сегментов журнала личных сообщений
+    app.job_queue.run_repeating(
+        compact_journal_job,
+        interval=COMPACT_INTERVAL,
+        first=COMPACT_INTERVAL,
+        name="compact_chat_journal"
+    )
+
+
+# Сброс всех резидентных данных на диск — при остановке и перед перезапуском бота
+def flush_persistent_state():
+    flush_users()
+    flush_cooldowns()
+    flush_stats()
+    close_storage()
@@ -0,0 +1,134 @@
+"""
+Профиль запуска бота — включается переменной окружения PROFILE_STARTUP=1 (см. utils/config.py).
+
+Показывает, на что уходит время старта (и, значит, каждого !restart):
+- импорт модулей: собственное время модуля и время вместе с вложенными импортами;
+- регистрация хэндлеров: время с предыдущей регистрации (создание фильтров и объекта
+  хэндлера) плюс сам add_handler — с разбивкой по модулю колбэка (callback.__module__).
+
+Отчёт пишется в лог один раз — после setup_all_handlers.
+"""
+
+import importlib.abc
+import logging
+import sys
+import time
+
+# Сколько самых медленных модулей показывать в отчёте
+TOP_IMPORTS = 15
+
+# Модули бота — по ним время показывается целиком (с вложенными импортами)
+PROJECT_PACKAGES = ("handlers", "utils")
+
+# Имя модуля -> [время с вложенными импортами, собственное время]
+_import_times = {}
+
+# Накопленное время вложенных импортов для каждого уровня вложенности
+_import_stack = []
+
+# Модуль колбэка -> [кол-во хэндлеров, время]
+_handler_times = {}
+
+_profile_started = None
+
+
+def _timed_exec_module(exec_module):
+    def wrapper(module):
+        start = time.perf_counter()
+        _import_stack.append(0.0)
+        try:
+            exec_module(module)
+        finally:
+            total = time.perf_counter() - start
+            children = _import_stack.pop()
+            if _import_stack:
+                _import_stack[-1] += total
+            _import_times[module.__name__] = [total, total - children]
+    return wrapper
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """Находит спецификацию модуля обычными средствами и оборачивает exec_module загрузчика"""
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            loader = spec.loader
+            # Встроенные/замороженные загрузчики — это классы, общие для всех модулей: их не трогаем
+            if loader is not None and not isinstance(loader, type) and hasattr(loader, "exec_module"):
+                loader.exec_module = _timed_exec_module(loader.exec_module)
+            return spec
+        return None
+
+
+# Включить замер импортов — вызывать как можно раньше, до импорта хэндлеров
+def enable_import_profile():
+    global _profile_started
+    if _profile_started is None:
+        _profile_started = time.perf_counter()
+        sys.meta_path.insert(0, _ImportTimer())
+
+
+def _handler_module(handler):
+    callback = getattr(handler, "callback", None)
+    if callback is None:
+        # ConversationHandler — считаем по первому entry point
+        entry_points = getattr(handler, "entry_points", None)
+        if entry_points:
+            callback = entry_points[0].callback
+    return getattr(callback, "__module__", None) or type(handler).__module__
+
+
+# Подменяет app.add_handler замером времени (до вызова setup_all_handlers)
+def profile_handler_registration(app):
+    add_handler = app.add_handler
+    last_call = [time.perf_counter()]
+
+    def timed_add_handler(handler, *args, **kwargs):
+        try:
+            return add_handler(handler, *args, **kwargs)
+        finally:
+            now = time.perf_counter()
+            stats = _handler_times.setdefault(_handler_module(handler), [0, 0.0])
+            stats[0] += 1
+            stats[1] += now - last_call[0]
+            last_call[0] = now
+
+    app.add_handler = timed_add_handler
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:8.1f} мс"
+
+
+# Отчёт о запуске в лог
+def log_startup_profile():
+    lines = ["⏱ Профиль запуска бота"]
+    if _profile_started is not None:
+        lines.append(f"Всего с начала замера: {_ms(time.perf_counter() - _profile_started)}")
+
+    lines.append(f"\n📦 Топ-{TOP_IMPORTS} импортов по собственному времени:")
+    slowest = sorted(_import_times.items(), key=lambda item: item[1][1], reverse=True)[:TOP_IMPORTS]
+    for name, (total, own) in slowest:
+        lines.append(f"{_ms(own)} (всего {_ms(total)})  {name}")
+
+    lines.append("\n🧩 Модули бота (с вложенными импортами):")
+    project = [
+        (name, total) for name, (total, _) in _import_times.items()
+        if name.split(".")[0] in PROJECT_PACKAGES
+    ]
+    for name, total in sorted(project, key=lambda item: item[1], reverse=True):
+        lines.append(f"{_ms(total)}  {name}")
+
+    lines.append("\n🔌 Регистрация хэндлеров по модулям:")
+    registration_total = 0.0
+    for module, (count, elapsed) in sorted(_handler_times.items(), key=lambda item: item[1][1], reverse=True):
+        registration_total += elapsed
+        lines.append(f"{_ms(elapsed)}  {module} ({count} шт.)")
+    lines.append(f"Итого регистрация: {_ms(registration_total)}")
+
+    logging.info("\n".join(lines))
@@ -0,0 +1,420 @@
+"""
+Хранилище данных бота с выбираемым движком (переменная окружения STORAGE_BACKEND, см. utils/config.py).
+
+Каждый набор данных (пользователи, администраторы, кулдауны, правила, статистика групп) — это
+таблица "ключ -> значение": значение хранится как JSON, операции — построчные:
+    store = get_store("rules", RULES_DB)
+    store.get(chat_id, [])  /  store.put(chat_id, pages)  /  store.delete(chat_id)
+
+Движки:
+- json   (по умолчанию) — прежние файлы database/*.json; файл читается один раз,
+  при изменении переписывается целиком (атомарно, не чаще раза в WRITE_DELAY секунд);
+- sqlite — одна база database/bot.sqlite3 в режиме WAL: отдельная таблица на набор данных
+  с первичным ключом, запись затрагивает только изменённые строки.
+
+Запись в обоих движках идёт через utils/persistence.py: изменения копятся и пачкой
+записываются в отдельном потоке, не блокируя event loop.
+Наборы данных читаются с диска один раз при запуске (open_storage() в потоке записи),
+дальше чтение идёт из памяти. Журнал личных сообщений — таблица chat_history с индексом
+по (user_id, id) (SqliteJournal); хэндлеры читают его через read_journal() (utils/chat_journal.py),
+вне event loop.
+
+При первом открытии SQLite-базы данные однократно переносятся из JSON-файлов
+(файлы остаются на месте как резервная копия). Перенос можно запустить и вручную:
+    python -m utils.storage migrate
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from utils.config import STORAGE_BACKEND
+from utils.persistence import atomic_write_bytes, flush_writes, schedule_write
+
+SQLITE_PATH = "database/bot.sqlite3"
+
+# Ошибки хранилища, которые хэндлеры перехватывают и логируют
+STORAGE_ERRORS = (OSError, sqlite3.Error)
+
+# Текущий движок (migrate_all переключает его на sqlite)
+_backend = STORAGE_BACKEND
+
+# Открытые хранилища: имя набора данных -> JsonStore / SqliteStore
+_stores = {}
+
+_connection = None
+_connection_lock = threading.Lock()
+
+# Отметка удалённой строки в очереди записи SqliteStore
+_DELETED = object()
+
+
+def _encode(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+class JsonStore:
+    """Набор данных в JSON-файле: весь словарь в памяти, при изменении файл переписывается"""
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self._data = None
+
+    # Весь набор данных. Для JSON это рабочий словарь хранилища — изменения в нём
+    # всё равно нужно подтвердить через put/put_many/delete
+    def load(self) -> dict:
+        if self._data is None:
+            self._data = read_json_file(self.path)
+        return self._data
+
+    def get(self, key, default=None):
+        return self.load().get(str(key), default)
+
+    def put(self, key, value):
+        self.load()[str(key)] = value
+        self._save()
+
+    def put_many(self, rows: dict):
+        if not rows:
+            return
+        data = self.load()
+        for key, value in rows.items():
+            data[str(key)] = value
+        self._save()
+
+    def delete(self, key):
+        if self.load().pop(str(key), None) is not None:
+            self._save()
+
+    # Файл переписывается атомарно и не чаще раза в WRITE_DELAY (utils/persistence.py)
+    def _save(self):
+        schedule_write(self.path, self._prepare_save)
+
+    def _prepare_save(self):
+        data = json.dumps(self._data, indent=2, ensure_ascii=False).encode("utf-8")
+        return lambda: atomic_write_bytes(self.path, data), None, None
+
+
+class SqliteStore:
+    """
+    Набор данных в таблице SQLite (key TEXT PRIMARY KEY, value — JSON).
+    Таблица читается один раз (open_storage() — при запуске, в потоке записи), дальше
+    чтение идёт из памяти. Изменения копятся в _pending и пачкой записываются в потоке
+    записи (utils/persistence.py): при записи пачка забирается целиком.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.table = f"kv_{name}"
+        self._data = None
+        # key -> значение или _DELETED: ещё не отданные в запись
+        self._pending = {}
+        with _connection_lock:
+            _get_connection().execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID"
+            )
+
+    # Весь набор данных — как у JsonStore, рабочий словарь хранилища
+    def load(self) -> dict:
+        if self._data is None:
+            with _connection_lock:
+                rows = _get_connection().execute(f"SELECT key, value FROM {self.table}").fetchall()
+            self._data = {key: json.loads(value) for key, value in rows}
+        return self._data
+
+    def get(self, key, default=None):
+        return self.load().get(str(key), default)
+
+    def put(self, key, value):
+        self.put_many({key: value})
+
+    def put_many(self, rows: dict):
+        if not rows:
+            return
+        data = self.load()
+        for key, value in rows.items():
+            data[str(key)] = self._pending[str(key)] = value
+        schedule_write(self.table, self._prepare_write)
+
+    def delete(self, key):
+        if self.load().pop(str(key), None) is not None:
+            self._pending[str(key)] = _DELETED
+            schedule_write(self.table, self._prepare_write)
+
+    def _prepare_write(self):
+        batch, self._pending = self._pending, {}
+        upserts = [(key, _encode(value)) for key, value in batch.items() if value is not _DELETED]
+        deletes = [(key,) for key, value in batch.items() if value is _DELETED]
+
+        def failed():
+            # Пачка возвращается в очередь; изменения, пришедшие после неё, важнее
+            self._pending = {**batch, **self._pending}
+
+        return lambda: self._write(upserts, deletes), None, failed
+
+    def _write(self, upserts, deletes=()):
+        with _connection_lock:
+            connection = _get_connection()
+            with connection:
+                connection.executemany(
+                    f"INSERT INTO {self.table} (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    upserts
+                )
+                connection.executemany(f"DELETE FROM {self.table} WHERE key = ?", deletes)
+
+    def is_empty(self) -> bool:
+        with _connection_lock:
+            return _get_connection().execute(f"SELECT 1 FROM {self.table} LIMIT 1").fetchone() is None
+
+
+class SqliteJournal:
+    """
+    Журнал личных сообщений в SQLite: записи по порядку добавления, индекс по user_id.
+    Новые записи пишутся пачкой в потоке записи. Чтение видит только записанное —
+    хэндлер читает через read_journal() (utils/chat_journal.py): после дописывания очереди,
+    в потоке записи.
+    """
+
+    def __init__(self):
+        # Записи, ещё не попавшие в базу
+        self._pending = []
+        with _connection_lock:
+            connection = _get_connection()
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS chat_history "
+                    "(id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, entry TEXT NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS chat_history_user_id ON chat_history (user_id, id)"
+                )
+
+    def append(self, entry: dict):
+        self._pending.append(entry)
+        schedule_write("chat_history", self._prepare_write)
+
+    def _prepare_write(self):
+        batch, self._pending = self._pending, []
+        rows = [(str(entry.get("user_id")), _encode(entry)) for entry in batch]
+
+        def failed():
+            # Пачка возвращается в начало очереди — порядок записей сохраняется
+            self._pending[:0] = batch
+
+        return lambda: self._insert(rows), None, failed
+
+    def _insert(self, rows):
+        with _connection_lock:
+            connection = _get_connection()
+            with connection:
+                connection.executemany("INSERT INTO chat_history (user_id, entry) VALUES (?, ?)", rows)
+
+    def _query(self, sql, params=()):
+        with _connection_lock:
+            rows = _get_connection().execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def iter_entries(self):
+        yield from self._query("SELECT entry FROM chat_history ORDER BY id")
+
+    def iter_user_entries(self, user_id):
+        yield from self._query(
+            "SELECT entry FROM chat_history WHERE user_id = ? ORDER BY id", (str(user_id),)
+        )
+
+    # user_id -> имя отправителя из первой записи (в порядке первого появления)
+    def distinct_users(self) -> dict:
+        entries = self._query(
+            "SELECT entry FROM chat_history WHERE id IN "
+            "(SELECT MIN(id) FROM chat_history GROUP BY user_id) ORDER BY id"
+        )
+        return {entry.get("user_id"): entry.get("sender_name") for entry in entries}
+
+    def is_empty(self) -> bool:
+        with _connection_lock:
+            return _get_connection().execute("SELECT 1 FROM chat_history LIMIT 1").fetchone() is None
+
+
+def read_json_file(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            logging.error(f"Повреждён файл {path} — набор данных пуст")
+            return {}
+
+
+def _get_connection():
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(SQLITE_PATH), exist_ok=True)
+        # Соединение общее для всех потоков — доступ сериализуется _connection_lock
+        _connection = sqlite3.connect(SQLITE_PATH, check_same_thread=False)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute("PRAGMA synchronous=NORMAL")
+        _connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    return _connection
+
+
+# Дописать все изменения и закрыть соединение с SQLite
+# (при остановке/перезапуске бота: WAL сливается в основной файл)
+def close_storage():
+    global _connection
+    flush_writes()
+    with _connection_lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+
+
+# Согласованная копия базы SQLite в файл target_path (для выгрузки): в режиме WAL основной файл
+# без -wal не содержит последних записей, поэтому копируется через backup(). Вызывается в потоке
+# записи (await run_io(snapshot_sqlite, path)) — после всех отправленных в него записей
+def snapshot_sqlite(target_path: str):
+    target = sqlite3.connect(target_path)
+    try:
+        with _connection_lock:
+            if _connection is not None:
+                _connection.backup(target)
+            else:
+                source = sqlite3.connect(SQLITE_PATH)
+                try:
+                    source.backup(target)
+                finally:
+                    source.close()
+    finally:
+        target.close()
+
+
+def use_sqlite() -> bool:
+    return _backend == "sqlite"
+
+
+# Хранилище набора данных; json_path — файл набора для движка json (и для переноса в SQLite)
+def get_store(name: str, json_path: str):
+    store = _stores.get(name)
+    if store is None:
+        if use_sqlite():
+            store = SqliteStore(name)
+            _migrate_dataset(store, json_path)
+        else:
+            store = JsonStore(name, json_path)
+        _stores[name] = store
+    return store
+
+
+_journal = None
+
+
+# Журнал личных сообщений в SQLite (None — используется файловый журнал utils/chat_journal.py)
+def get_sqlite_journal():
+    global _journal
+    if not use_sqlite():
+        return None
+    if _journal is None:
+        _journal = SqliteJournal()
+        _migrate_journal(_journal)
+    return _journal
+
+
+def _is_migrated(name: str) -> bool:
+    with _connection_lock:
+        return _get_connection().execute(
+            "SELECT 1 FROM meta WHERE key = ?", (f"migrated:{name}",)
+        ).fetchone() is not None
+
+
+def _mark_migrated(name: str):
+    with _connection_lock:
+        connection = _get_connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, '1')", (f"migrated:{name}",)
+            )
+
+
+# Однократный перенос набора данных из JSON-файла (только в пустую таблицу)
+def _migrate_dataset(store: SqliteStore, json_path: str):
+    if _is_migrated(store.name):
+        return
+    if store.is_empty():
+        rows = read_json_file(json_path)
+        store._write([(str(key), _encode(value)) for key, value in rows.items()])
+        if rows:
+            logging.info(f"[STORAGE] {json_path} -> SQLite: перенесено записей: {len(rows)}")
+    _mark_migrated(store.name)
+
+
+def _migrate_journal(journal: SqliteJournal):
+    if _is_migrated("chat_history"):
+        return
+    if journal.is_empty():
+        from utils.chat_journal import iter_file_entries
+
+        batch = []
+        total = 0
+        for entry in iter_file_entries():
+            batch.append((str(entry.get("user_id")), _encode(entry)))
+            if len(batch) >= 1000:
+                journal._insert(batch)
+                total += len(batch)
+                batch = []
+        journal._insert(batch)
+        total += len(batch)
+        if total:
+            logging.info(f"[STORAGE] Журнал сообщений -> SQLite: перенесено записей: {total}")
+    _mark_migrated("chat_history")
+
+
+# Все известные наборы данных (модули сами объявляют их при обращении к хранилищу)
+def _open_all_stores() -> list:
+    from utils import users, admins
+    from handlers.admin import cooldown_admin
+    from handlers import rules_bot, group_stats_updater
+
+    return [
+        users._get_store(),
+        admins._get_store(),
+        cooldown_admin._get_store(),
+        rules_bot._get_store(),
+        group_stats_updater._get_store(),
+    ]
+
+
+# Открытие хранилища при запуске: перенос в SQLite (если нужен) и чтение всех наборов
+# данных в память. Вызывается в потоке записи (await run_io(open_storage)), чтобы
+# обращения к диску не шли в event loop
+def open_storage():
+    for store in _open_all_stores():
+        store.load()
+    if get_sqlite_journal() is None:
+        from utils import chat_journal
+
+        chat_journal._open_journal()  # Индекс файлового журнала
+
+
+# Ручной перенос всех известных наборов данных (python -m utils.storage migrate)
+def migrate_all():
+    global _backend
+    _backend = "sqlite"
+    _open_all_stores()
+    get_sqlite_journal()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] == ["migrate"]:
+        # Модули бота импортируют utils.storage, а не __main__ — работаем с тем же экземпляром
+        from utils import storage
+        storage.migrate_all()
+        print(f"✅ Данные перенесены в {SQLITE_PATH}. Для работы на SQLite задайте STORAGE_BACKEND=sqlite")
+    else:
+        print("Использование: python -m utils.storage migrate")
@@ -0,0 +1,64 @@
+import asyncio
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка апдейтов с сохранением порядка внутри чата.
+
+    Апдейты разных чатов обрабатываются одновременно (не больше max_concurrent_updates),
+    а апдейты одного чата — строго по очереди, в порядке получения: на каждый чат
+    заводится asyncio.Lock (он отдаёт блокировку ожидающим в порядке FIFO).
+    Поэтому ходы рулетки и шаги ConversationHandler в одном чате не перемешиваются,
+    а медленная команда в одном чате не тормозит остальные.
+    """
+    __slots__ = ("_chat_locks",)
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # ключ чата -> [Lock, сколько апдейтов держат/ждут его]
+        self._chat_locks = {}
+
+    @staticmethod
+    def _ordering_key(update):
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return ("user", update.effective_user.id)
+        return None
+
+    # Порядок важен: сначала блокировка чата, потом общий семафор. Базовый process_update
+    # берёт семафор первым — тогда апдейты, ждущие своей очереди в одном занятом чате,
+    # держали бы слоты max_concurrent_updates и останавливали все остальные чаты.
+    async def process_update(self, update, coroutine):
+        key = self._ordering_key(update)
+        if key is None:
+            async with self._semaphore:
+                await self.do_process_update(update, coroutine)
+            return
+
+        entry = self._chat_locks.get(key)
+        if entry is None:
+            entry = self._chat_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._semaphore:
+                    await self.do_process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                # Больше никто не ждёт — освобождаем память
+                del self._chat_locks[key]
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
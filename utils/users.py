@@ -1,36 +1,60 @@
-import json
-import os
+import logging
+from utils.storage import get_store, STORAGE_ERRORS
 
 USERS_DB = "database/users.json"
 
+# Как часто (в секундах) накопленные изменения сбрасываются на диск
+USERS_FLUSH_INTERVAL = 30
 
-# Загружаем пользователей из базы данных
-def load_users():
-    if not os.path.exists(USERS_DB):
-        return {}
-    with open(USERS_DB, 'r') as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
+# 🧠 Резидентный справочник username -> ID (загружается с диска один раз)
+_users = None
 
+# Username'ы, изменившиеся с момента последней записи
+_pending_changes = set()
 
-# Сохраняем пользователей в базу данных
-def save_users(users: dict):
-    with open(USERS_DB, 'w') as f:
-        json.dump(users, f, indent=2)
 
+# Хранилище справочника (utils/storage.py): username -> ID
+def _get_store():
+    return get_store("users", USERS_DB)
 
-# Регистрируем пользователя в базе
+
+# Справочник в памяти — при первом обращении читаем хранилище, дальше работаем только с dict
+def _get_directory():
+    global _users
+    if _users is None:
+        _users = _get_store().load()
+    return _users
+
+
+# Регистрируем пользователя в базе (запись — отложенная, пачкой)
 def register_user(user):
     if not user.username:
         return
-    users = load_users()
+    users = _get_directory()
+    if users.get(user.username) == user.id:
+        return  # Связка не изменилась — ничего не делаем
     users[user.username] = user.id
-    save_users(users)
+    _pending_changes.add(user.username)
 
 
 # Получаем ID пользователя по его username
 def get_user_id_by_username(username: str):
-    users = load_users()
-    return users.get(username)
+    return _get_directory().get(username)
+
+
+# Записываем накопленные изменения (только изменившиеся строки)
+def flush_users():
+    if not _pending_changes or _users is None:
+        return
+    try:
+        _get_store().put_many({username: _users[username] for username in _pending_changes})
+    except STORAGE_ERRORS as e:
+        logging.error(f"Ошибка записи справочника пользователей: {type(e).__name__} - {e}")
+        return
+    logging.debug(f"[USERS] Записано изменений: {len(_pending_changes)}")
+    _pending_changes.clear()
+
+
+# Задача для JobQueue — периодический сброс справочника на диск
+async def flush_users_job(context):
+    flush_users()